@@ -1,226 +1,231 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import base64
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import binascii
+import cProfile
 import cv2
+import functools
+import gc
+import hmac
 import numpy as np
 import mediapipe as mp
 import math
 import boto3
 import json
+import os
+import pickle
+import pstats
+import stat
+import tempfile
+import threading
 import time
+import tracemalloc
+import warnings
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+try:
+    import fcntl
+except ImportError:  # Windows - 스냅샷 파일 잠금 없이 동작
+    fcntl = None
+
+@asynccontextmanager
+async def lifespan(app):
+    """시작 시 세션 스냅샷 복원, 종료 시 저장 (restore_sessions/save_sessions는 아래 세션 스냅샷 섹션)"""
+    await restore_sessions()
+    yield
+    await save_sessions()
+
+app = FastAPI(lifespan=lifespan)
 
 # MediaPipe 초기화
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=False,
-    model_complexity=1,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+
+# Pose 그래프는 내부 스레드를 가지므로 fork 후 공유할 수 없음 - 프로세스마다 처음 쓸 때 생성
+_pose = None
+_pose_pid = None
+
+def get_pose():
+    """현재 프로세스의 MediaPipe Pose 그래프 (prefork 자식은 부모 것을 쓰지 않고 새로 생성)"""
+    global _pose, _pose_pid
+    if _pose is None or _pose_pid != os.getpid():
+        _pose = mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=1,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        _pose_pid = os.getpid()
+    return _pose
 
 # ============= 왼팔 + 왼쪽 다리 + 오른쪽 다리 IoT 기능 추가 =============
 # AWS IoT Core 클라이언트
 iot_client = boto3.client('iot-data', region_name='ap-northeast-2')
 
-# 왼팔 오류 관리 - 지속시간 기반
-left_arm_error_start_time = None  # 오류 시작 시간
-left_arm_error_sent_time = 0      # 마지막 알림 전송 시간
+# 부위별 오류 알림 기준 - 지속시간 기반
 LEFT_ARM_DURATION_THRESHOLD = 3.0  # 3초간 지속되어야 알림
 LEFT_ARM_COOLDOWN_SECONDS = 10.0   # 10초 쿨다운
+LEFT_LEG_DURATION_THRESHOLD = 3.0
+LEFT_LEG_COOLDOWN_SECONDS = 10.0
+RIGHT_LEG_DURATION_THRESHOLD = 3.0
+RIGHT_LEG_COOLDOWN_SECONDS = 10.0
+RIGHT_ARM_DURATION_THRESHOLD = 3.0
+RIGHT_ARM_COOLDOWN_SECONDS = 10.0
+
+class ErrorDurationTracker:
+    """
+    부위 하나의 오류가 일정 시간 지속되는지 체크하고 알림 전송
+    - 세션(사람)마다 부위별로 하나씩 생성되므로 여러 사용자의 타이머가 섞이지 않음
+    """
+    def __init__(self, label: str, send_alert, duration_threshold: float, cooldown_seconds: float):
+        self.label = label                  # 로그용 부위 이름 ("왼팔" 등)
+        self.send_alert = send_alert
+        self.duration_threshold = duration_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.error_start_time = None        # 오류 시작 시간
+        self.error_sent_time = 0            # 마지막 알림 전송 시간
+
+    def check(self, has_error: bool, current_time: float = None):
+        current_time = time.time() if current_time is None else current_time
+
+        if has_error:
+            # 오류가 있는 상태
+            if self.error_start_time is None:
+                # 오류 시작
+                self.error_start_time = current_time
+                print(f"⚠️ {self.label} 오류 감지 시작 - {self.duration_threshold}초 대기 중...")
+                return False
 
-# 왼쪽 다리 오류 관리 - 지속시간 기반
-left_leg_error_start_time = None  # 오류 시작 시간
-left_leg_error_sent_time = 0      # 마지막 알림 전송 시간
-LEFT_LEG_DURATION_THRESHOLD = 3.0  # 3초간 지속되어야 알림
-LEFT_LEG_COOLDOWN_SECONDS = 10.0   # 10초 쿨다운
-
-# 오른쪽 다리 오류 관리 - 지속시간 기반
-right_leg_error_start_time = None  # 오류 시작 시간
-right_leg_error_sent_time = 0      # 마지막 알림 전송 시간
-RIGHT_LEG_DURATION_THRESHOLD = 3.0  # 3초간 지속되어야 알림
-RIGHT_LEG_COOLDOWN_SECONDS = 10.0   # 10초 쿨다운
-
-# 오른팔 오류 관리 - 지속시간 기반
-right_arm_error_start_time = None  # 오류 시작 시간
-right_arm_error_sent_time = 0      # 마지막 알림 전송 시간
-RIGHT_ARM_DURATION_THRESHOLD = 3.0  # 3초간 지속되어야 알림
-RIGHT_ARM_COOLDOWN_SECONDS = 10.0   # 10초 쿨다운
-
-def check_left_arm_error_duration(has_error):
-    """왼팔 오류가 일정 시간 지속되는지 체크하고 알림 전송"""
-    global left_arm_error_start_time, left_arm_error_sent_time
-    
-    current_time = time.time()
-    
-    if has_error:
-        # 오류가 있는 상태
-        if left_arm_error_start_time is None:
-            # 오류 시작
-            left_arm_error_start_time = current_time
-            print(f"⚠️ 왼팔 오류 감지 시작 - {LEFT_ARM_DURATION_THRESHOLD}초 대기 중...")
-            return False
-        else:
             # 오류가 계속 지속 중
-            error_duration = current_time - left_arm_error_start_time
-            
-            if error_duration >= LEFT_ARM_DURATION_THRESHOLD:
+            error_duration = current_time - self.error_start_time
+
+            if error_duration >= self.duration_threshold:
                 # 임계 시간 이상 지속됨 - 쿨다운 체크
-                if current_time - left_arm_error_sent_time >= LEFT_ARM_COOLDOWN_SECONDS:
+                if current_time - self.error_sent_time >= self.cooldown_seconds:
                     # 알림 전송
-                    success = send_left_arm_alert()
+                    success = self.send_alert()
                     if success:
-                        left_arm_error_sent_time = current_time
-                        print(f"🚨 왼팔 오류 {error_duration:.1f}초 지속 - 알림 전송!")
+                        self.error_sent_time = current_time
+                        print(f"🚨 {self.label} 오류 {error_duration:.1f}초 지속 - 알림 전송!")
                         return True
-                else:
-                    cooldown_remaining = LEFT_ARM_COOLDOWN_SECONDS - (current_time - left_arm_error_sent_time)
-                    print(f"🔄 왼팔 오류 지속 중 - 쿨다운 {cooldown_remaining:.1f}초 남음")
                     return False
-            else:
-                # 아직 임계 시간 미달
-                remaining_time = LEFT_ARM_DURATION_THRESHOLD - error_duration
-                print(f"⏳ 왼팔 오류 지속 중 - {remaining_time:.1f}초 후 알림 예정")
+                cooldown_remaining = self.cooldown_seconds - (current_time - self.error_sent_time)
+                print(f"🔄 {self.label} 오류 지속 중 - 쿨다운 {cooldown_remaining:.1f}초 남음")
                 return False
-    else:
-        # 오류가 없는 상태 - 리셋
-        if left_arm_error_start_time is not None:
-            error_duration = current_time - left_arm_error_start_time
-            print(f"✅ 왼팔 오류 해결됨 (지속시간: {error_duration:.1f}초)")
-            left_arm_error_start_time = None
-        return False
 
-def check_left_leg_error_duration(has_error):
-    """왼쪽 다리 오류가 일정 시간 지속되는지 체크하고 알림 전송"""
-    global left_leg_error_start_time, left_leg_error_sent_time
-    
-    current_time = time.time()
-    
-    if has_error:
-        # 오류가 있는 상태
-        if left_leg_error_start_time is None:
-            # 오류 시작
-            left_leg_error_start_time = current_time
-            print(f"⚠️ 왼쪽 다리 오류 감지 시작 - {LEFT_LEG_DURATION_THRESHOLD}초 대기 중...")
+            # 아직 임계 시간 미달
+            remaining_time = self.duration_threshold - error_duration
+            print(f"⏳ {self.label} 오류 지속 중 - {remaining_time:.1f}초 후 알림 예정")
             return False
-        else:
-            # 오류가 계속 지속 중
-            error_duration = current_time - left_leg_error_start_time
-            
-            if error_duration >= LEFT_LEG_DURATION_THRESHOLD:
-                # 임계 시간 이상 지속됨 - 쿨다운 체크
-                if current_time - left_leg_error_sent_time >= LEFT_LEG_COOLDOWN_SECONDS:
-                    # 알림 전송
-                    success = send_left_leg_alert()
-                    if success:
-                        left_leg_error_sent_time = current_time
-                        print(f"🚨 왼쪽 다리 오류 {error_duration:.1f}초 지속 - 알림 전송!")
-                        return True
-                else:
-                    cooldown_remaining = LEFT_LEG_COOLDOWN_SECONDS - (current_time - left_leg_error_sent_time)
-                    print(f"🔄 왼쪽 다리 오류 지속 중 - 쿨다운 {cooldown_remaining:.1f}초 남음")
-                    return False
-            else:
-                # 아직 임계 시간 미달
-                remaining_time = LEFT_LEG_DURATION_THRESHOLD - error_duration
-                print(f"⏳ 왼쪽 다리 오류 지속 중 - {remaining_time:.1f}초 후 알림 예정")
-                return False
-    else:
+
         # 오류가 없는 상태 - 리셋
-        if left_leg_error_start_time is not None:
-            error_duration = current_time - left_leg_error_start_time
-            print(f"✅ 왼쪽 다리 오류 해결됨 (지속시간: {error_duration:.1f}초)")
-            left_leg_error_start_time = None
+        if self.error_start_time is not None:
+            error_duration = current_time - self.error_start_time
+            print(f"✅ {self.label} 오류 해결됨 (지속시간: {error_duration:.1f}초)")
+            self.error_start_time = None
         return False
 
-def check_right_leg_error_duration(has_error):
-    """오른쪽 다리 오류가 일정 시간 지속되는지 체크하고 알림 전송"""
-    global right_leg_error_start_time, right_leg_error_sent_time
-    
-    current_time = time.time()
-    
-    if has_error:
-        # 오류가 있는 상태
-        if right_leg_error_start_time is None:
-            # 오류 시작
-            right_leg_error_start_time = current_time
-            print(f"⚠️ 오른쪽 다리 오류 감지 시작 - {RIGHT_LEG_DURATION_THRESHOLD}초 대기 중...")
+    def is_sustained(self, current_time: float):
+        """오류가 임계 시간 이상 지속 중인지"""
+        return (self.error_start_time is not None and
+                current_time - self.error_start_time >= self.duration_threshold)
+
+    def __getstate__(self):
+        # 세션 스냅샷에는 타이머 값만 저장 - send_alert 콜백은 복원할 때 SessionState가 다시 연결
+        state = dict(self.__dict__)
+        state["send_alert"] = None
+        return state
+
+# ============= 기기 상태 통합 발행 =============
+DEVICE_STATE_TOPIC = "esp32/state"      # 팔다리 상태를 한 메시지로 받는 토픽
+DEVICE_MIN_PUBLISH_INTERVAL = 1.0       # 기기(세션)당 최소 발행 간격 (초)
+
+# 부위별 비트 - errorCodes(1~4)와 같은 순서
+LIMB_BITS = {
+    "left_arm": 1,
+    "right_arm": 2,
+    "left_leg": 4,
+    "right_leg": 8,
+}
+
+class DeviceStatePublisher:
+    """
+    세션(기기) 하나의 팔다리 알림 상태를 한 메시지로 묶어 발행
+    - active: 임계 시간 이상 오류가 지속 중인 부위 비트마스크
+    - alert: 새로 알림(부저)을 울려야 하는 부위 비트마스크 (ErrorDurationTracker가 지속시간/쿨다운 판단)
+    - active가 바뀌었거나 울릴 alert가 있을 때만 발행
+    - 기기당 최소 발행 간격 제한 - 제한에 걸린 변경은 다음 프레임에 합쳐서 발행
+    """
+    def __init__(self, device_id: str, min_interval: float = DEVICE_MIN_PUBLISH_INTERVAL):
+        self.device_id = device_id
+        self.min_interval = min_interval
+        self.seq = 0
+        self.last_active = 0
+        self.pending_alert = 0
+        self.last_publish_time = 0.0
+        self.published = 0
+        self.suppressed = 0     # 간격 제한으로 미뤄진 횟수
+
+    def request_alert(self, part: str):
+        """ErrorDurationTracker의 send_alert 콜백 - 다음 flush에 포함될 알림 예약"""
+        self.pending_alert |= LIMB_BITS[part]
+        return True
+
+    def flush(self, active: int, current_time: float = None):
+        """상태가 바뀌었으면 한 메시지로 발행"""
+        current_time = time.time() if current_time is None else current_time
+
+        if active == self.last_active and not self.pending_alert:
+            return False
+        if current_time - self.last_publish_time < self.min_interval:
+            self.suppressed += 1
             return False
-        else:
-            # 오류가 계속 지속 중
-            error_duration = current_time - right_leg_error_start_time
-            
-            if error_duration >= RIGHT_LEG_DURATION_THRESHOLD:
-                # 임계 시간 이상 지속됨 - 쿨다운 체크
-                if current_time - right_leg_error_sent_time >= RIGHT_LEG_COOLDOWN_SECONDS:
-                    # 알림 전송
-                    success = send_right_leg_alert()
-                    if success:
-                        right_leg_error_sent_time = current_time
-                        print(f"🚨 오른쪽 다리 오류 {error_duration:.1f}초 지속 - 알림 전송!")
-                        return True
-                else:
-                    cooldown_remaining = RIGHT_LEG_COOLDOWN_SECONDS - (current_time - right_leg_error_sent_time)
-                    print(f"🔄 오른쪽 다리 오류 지속 중 - 쿨다운 {cooldown_remaining:.1f}초 남음")
-                    return False
-            else:
-                # 아직 임계 시간 미달
-                remaining_time = RIGHT_LEG_DURATION_THRESHOLD - error_duration
-                print(f"⏳ 오른쪽 다리 오류 지속 중 - {remaining_time:.1f}초 후 알림 예정")
-                return False
-    else:
-        # 오류가 없는 상태 - 리셋
-        if right_leg_error_start_time is not None:
-            error_duration = current_time - right_leg_error_start_time
-            print(f"✅ 오른쪽 다리 오류 해결됨 (지속시간: {error_duration:.1f}초)")
-            right_leg_error_start_time = None
-        return False
 
-def check_right_arm_error_duration(has_error):
-    """오른팔 오류가 일정 시간 지속되는지 체크하고 알림 전송"""
-    global right_arm_error_start_time, right_arm_error_sent_time
-    
-    current_time = time.time()
-    
-    if has_error:
-        # 오류가 있는 상태
-        if right_arm_error_start_time is None:
-            # 오류 시작
-            right_arm_error_start_time = current_time
-            print(f"⚠️ 오른팔 오류 감지 시작 - {RIGHT_ARM_DURATION_THRESHOLD}초 대기 중...")
+        message = {
+            "device": self.device_id,
+            "seq": self.seq + 1,
+            "active": active,
+            "alert": self.pending_alert,
+            "ts": round(current_time, 3)
+        }
+        try:
+            iot_client.publish(
+                topic=DEVICE_STATE_TOPIC,
+                qos=1,
+                payload=json.dumps(message, separators=(",", ":"))
+            )
+        except Exception as e:
+            print(f"❌ 기기 상태 전송 실패: {e}")
             return False
-        else:
-            # 오류가 계속 지속 중
-            error_duration = current_time - right_arm_error_start_time
-            
-            if error_duration >= RIGHT_ARM_DURATION_THRESHOLD:
-                # 임계 시간 이상 지속됨 - 쿨다운 체크
-                if current_time - right_arm_error_sent_time >= RIGHT_ARM_COOLDOWN_SECONDS:
-                    # 알림 전송
-                    success = send_right_arm_alert()
-                    if success:
-                        right_arm_error_sent_time = current_time
-                        print(f"🚨 오른팔 오류 {error_duration:.1f}초 지속 - 알림 전송!")
-                        return True
-                else:
-                    cooldown_remaining = RIGHT_ARM_COOLDOWN_SECONDS - (current_time - right_arm_error_sent_time)
-                    print(f"🔄 오른팔 오류 지속 중 - 쿨다운 {cooldown_remaining:.1f}초 남음")
-                    return False
-            else:
-                # 아직 임계 시간 미달
-                remaining_time = RIGHT_ARM_DURATION_THRESHOLD - error_duration
-                print(f"⏳ 오른팔 오류 지속 중 - {remaining_time:.1f}초 후 알림 예정")
-                return False
-    else:
-        # 오류가 없는 상태 - 리셋
-        if right_arm_error_start_time is not None:
-            error_duration = current_time - right_arm_error_start_time
-            print(f"✅ 오른팔 오류 해결됨 (지속시간: {error_duration:.1f}초)")
-            right_arm_error_start_time = None
-        return False
+
+        self.seq += 1
+        self.published += 1
+        self.last_active = active
+        self.pending_alert = 0
+        self.last_publish_time = current_time
+        print(f"📡 기기 상태 전송 - active={active:04b} alert={message['alert']:04b}")
+        return True
+
+def create_alert_trackers(device: DeviceStatePublisher):
+    """
+    부위별 오류 추적기 생성 - 키는 score_pose_components의 '<부위>_bad' 필드와 대응
+    - 알림은 부위별 토픽으로 바로 보내지 않고 device에 예약했다가 한 메시지로 발행
+    """
+    return {
+        "left_arm": ErrorDurationTracker("왼팔", functools.partial(device.request_alert, "left_arm"),
+                                         LEFT_ARM_DURATION_THRESHOLD, LEFT_ARM_COOLDOWN_SECONDS),
+        "right_arm": ErrorDurationTracker("오른팔", functools.partial(device.request_alert, "right_arm"),
+                                          RIGHT_ARM_DURATION_THRESHOLD, RIGHT_ARM_COOLDOWN_SECONDS),
+        "left_leg": ErrorDurationTracker("왼쪽 다리", functools.partial(device.request_alert, "left_leg"),
+                                         LEFT_LEG_DURATION_THRESHOLD, LEFT_LEG_COOLDOWN_SECONDS),
+        "right_leg": ErrorDurationTracker("오른쪽 다리", functools.partial(device.request_alert, "right_leg"),
+                                          RIGHT_LEG_DURATION_THRESHOLD, RIGHT_LEG_COOLDOWN_SECONDS),
+    }
+
+# ============= 부위별 수동 알림 (/api/*-alert 엔드포인트용) =============
 
 def send_left_arm_alert():
     """왼팔 오류 시 ESP32로 알림 전송"""
@@ -314,6 +319,35 @@ def send_right_arm_alert():
 class PoseAnalysisRequest(BaseModel):
     image: str
     exercise_code: str = "standing"
+    session_id: str = "default"
+    delta: bool = False      # True면 이전 응답에서 바뀐 필드만 전송
+    keyframe: bool = False   # delta 모드에서 전체 응답 강제 (클라이언트 재동기화)
+
+class GroupAnalysisRequest(BaseModel):
+    image: str
+    exercise_code: str = "standing"
+    session_id: str = "default"
+    max_people: int = Field(8, ge=1)
+
+class LandmarkAnalysisRequest(BaseModel):
+    frames: List[List[List[float]]]            # 프레임별 랜드마크 33개 [x, y, z, visibility]
+    timestamps: Optional[List[float]] = None   # 프레임별 클라이언트 시각(초) - 2프레임 이상이면 필수, 1프레임이면 없을 때 수신 시각
+    exercise_code: str = "standing"
+    session_id: str = "default"
+    delta: bool = False
+    keyframe: bool = False
+
+def _delta_session_error(request):
+    """
+    delta 모드는 세션별 DeltaEncoder 기준으로 diff를 만들므로 session_id를 직접 지정해야 함
+    - 지정하지 않은 클라이언트끼리 "default" 세션을 공유하면 서로의 응답 기준 diff를 받아 상태가 조용히 어긋남
+    """
+    if request.delta and "session_id" not in request.model_fields_set:
+        return JSONResponse(content={
+            "success": False,
+            "message": "delta 모드에서는 session_id를 지정해야 합니다"
+        }, status_code=400)
+    return None
 
 # CORS 설정
 app.add_middleware(
@@ -421,16 +455,141 @@ EXERCISE_PARAMS = {
     },
 }
 
+# ================== 관절 각도 계산 ==================
+# 관절 이름 → (a, b, c) 랜드마크 인덱스 (b가 꼭짓점)
+JOINT_ANGLE_TRIPLETS = {
+    "left_elbow": (11, 13, 15),        # 어깨-팔꿈치-손목
+    "right_elbow": (12, 14, 16),
+    "left_knee": (23, 25, 27),         # 골반-무릎-발목
+    "right_knee": (24, 26, 28),
+    "left_hip": (11, 23, 25),          # 어깨-골반-무릎
+    "right_hip": (12, 24, 26),
+    "left_body_line": (11, 23, 27),    # 어깨-골반-발목 (몸통 일직선)
+    "right_body_line": (12, 24, 28),
+}
+
+def compute_joint_angles(lms: list, joints=None):
+    """landmarks 리스트(dict들)에서 관절 각도 계산 (계산 불가 시 None)"""
+    angles = {}
+    for name in (joints or JOINT_ANGLE_TRIPLETS):
+        ia, ib, ic = JOINT_ANGLE_TRIPLETS[name]
+        try:
+            a, b, c = lms[ia], lms[ib], lms[ic]
+            angles[name] = _angle_deg_3d(
+                (a["x"], a["y"], a.get("z", 0.0)),
+                (b["x"], b["y"], b.get("z", 0.0)),
+                (c["x"], c["y"], c.get("z", 0.0)),
+            )
+        except Exception:
+            angles[name] = None
+    return angles
+
+def compute_joint_angles_batch(frames, joints=None):
+    """
+    녹화된 랜드마크 시퀀스 전체의 관절 각도를 NumPy로 한 번에 계산
+    - frames: (T, 33, 3) 또는 (T, 33, 4) 배열 (x, y, z[, visibility])
+    - 반환: {관절 이름: (T,) 각도 배열}, 계산 불가 프레임은 NaN
+    """
+    pts = np.asarray(frames, dtype=np.float64)[..., :3]
+    angles = {}
+    for name in (joints or JOINT_ANGLE_TRIPLETS):
+        ia, ib, ic = JOINT_ANGLE_TRIPLETS[name]
+        ba = pts[:, ia] - pts[:, ib]
+        bc = pts[:, ic] - pts[:, ib]
+        denom = np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cosang = np.einsum("ij,ij->i", ba, bc) / denom
+        ang = np.degrees(np.arccos(np.clip(cosang, -1.0, 1.0)))
+        ang[denom == 0] = np.nan
+        angles[name] = ang
+    return angles
+
+def _reduce_angles(values, mode="mean"):
+    """여러 관절 각도를 하나로 합침 (None/NaN 제외)"""
+    vs = [v for v in values if v is not None and not math.isnan(v)]
+    if not vs:
+        return None
+    if mode == "min":
+        return min(vs)
+    if mode == "max":
+        return max(vs)
+    return sum(vs) / len(vs)
+
+def _reduce_angles_batch(columns, mode="mean"):
+    """_reduce_angles의 배치 버전 - (T,) 배열들을 프레임별로 합침"""
+    stacked = np.vstack(columns)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # 전부 NaN인 프레임
+        if mode == "min":
+            return np.nanmin(stacked, axis=0)
+        if mode == "max":
+            return np.nanmax(stacked, axis=0)
+        return np.nanmean(stacked, axis=0)
+
+# ================== 각도 링 버퍼 ==================
+class AngleRingBuffer:
+    """
+    최근 관절 각도를 고정 크기 NumPy 배열에 보관하는 링 버퍼
+    - 세션이 길어져도 메모리가 늘지 않고, push/조회는 프레임당 상수 시간
+    """
+    def __init__(self, size: int = 64):
+        self.size = size
+        self.angles = np.full(size, np.nan)
+        self.times = np.zeros(size)
+        self.head = 0    # 다음에 기록할 위치
+        self.count = 0
+
+    def push(self, angle: float, t: float):
+        self.angles[self.head] = angle
+        self.times[self.head] = t
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def mean_last(self, n: int):
+        """최근 n개 각도의 평균 (스무딩용)"""
+        n = min(n, self.count)
+        if n == 0:
+            return None
+        total = 0.0
+        for i in range(1, n + 1):
+            total += self.angles[(self.head - i) % self.size]
+        return float(total / n)
+
+    def rate_last(self, n: int):
+        """최근 n개 각도 구간의 평균 각속도 (도/초, 데이터가 부족하면 None)"""
+        n = min(n, self.count)
+        if n < 2:
+            return None
+        newest = (self.head - 1) % self.size
+        oldest = (self.head - n) % self.size
+        dt = self.times[newest] - self.times[oldest]
+        if dt <= 0:
+            return None
+        return float((self.angles[newest] - self.angles[oldest]) / dt)
+
+    def __getstate__(self):
+        # 세션 스냅샷용 - ndarray 대신 raw bytes로 저장 (pickle 시 배열 재구성 오버헤드 회피)
+        state = dict(self.__dict__)
+        state["angles"] = self.angles.tobytes()
+        state["times"] = self.times.tobytes()
+        return state
+
+    def __setstate__(self, state):
+        state["angles"] = np.frombuffer(state["angles"]).copy()
+        state["times"] = np.frombuffer(state["times"]).copy()
+        self.__dict__.update(state)
+
 # ================== 반복(Rep) 카운터 ==================
 class RepCounter:
     """
-    스쿼트/런지 등 '위→아래→위' 패턴 운동의 반복 수를 세기 위한 상태 머신
-    - knee_angle: 왼쪽 무릎 각도 기준 (도 단위)
-    - 노이즈로 인한 오검출을 줄이기 위해
-      ▷ 각도 변화 방향(내려감/올라감)
-      ▷ 최소 움직임 각도
+    스쿼트/런지/푸시업 등 '위→아래→위' 패턴 운동의 반복 수를 세기 위한 상태 머신
+    - angle: 운동별로 설정된 관절 각도 (도 단위, 무릎/팔꿈치/골반 등)
+    - 최근 각도는 링 버퍼에 보관하고, 짧은 이동 평균으로 스무딩
+    - 봉우리(peak)/골짜기(valley)를 증분 방식으로 추적해서
+      ▷ 봉우리에서 min_motion_deg 이상 내려와 bottom_thr 아래 → 하강
+      ▷ 골짜기에서 min_motion_deg 이상 올라와 top_thr 위 → 1회 완료
       ▷ down 상태 유지 프레임 수
-      를 추가로 확인한다.
+      를 확인한다.
     """
     def __init__(
         self,
@@ -439,7 +598,10 @@ class RepCounter:
         name: str = "unknown",
         min_depth_bonus: float = 5.0,   # bottom_thr보다 최소 이만큼 더 내려가야 깊이 OK
         min_down_frames: int = 3,       # down 상태 최소 유지 프레임 수
-        min_motion_deg: float = 10.0    # 한 번에 이 정도 이상 각도 차이가 있어야 "움직였다"로 인정
+        min_motion_deg: float = 10.0,   # 봉우리/골짜기에서 이 정도 이상 움직여야 "움직였다"로 인정
+        valid_range: tuple = (60.0, 200.0),  # 이 범위 밖의 각도는 인식 오류로 무시
+        smooth_window: int = 3,         # 이동 평균 프레임 수
+        buffer_size: int = 64
     ):
         self.name = name
         self.top_thr = top_thr
@@ -451,72 +613,68 @@ class RepCounter:
         self.wrong_reps = 0
 
         self.current_rep_has_error = False
-        self.current_rep_min_angle = 999.0
+        self.current_rep_min_angle = 999.0   # 현재 반복의 골짜기
+        self.peak_angle = None               # 직전 봉우리
 
         # 노이즈 필터링용
-        self.last_knee_angle = None
+        self.buffer = AngleRingBuffer(buffer_size)
+        self.last_angle = None
         self.down_frames = 0
         self.min_depth_bonus = min_depth_bonus
         self.min_down_frames = min_down_frames
         self.min_motion_deg = min_motion_deg
+        self.valid_range = valid_range
+        self.smooth_window = smooth_window
 
-    def update(self, knee_angle: float, analysis: dict):
+    def update(self, angle: float, analysis: dict = None, t: float = None):
         """
         매 프레임마다 호출해서 상태 업데이트
-        - knee_angle: 현재 프레임의 왼쪽 무릎 각도
-        - analysis: score_pose_components의 결과(dict)
+        - angle: 현재 프레임의 관절 각도
+        - analysis: score_pose_components의 결과(dict), 배치 재생 시 None 가능
+        - t: 프레임 시각 (None이면 현재 시각)
         """
-        if knee_angle is None:
+        if angle is None or math.isnan(angle):
             return
 
         # 말도 안 되는 각도 값(인식 오류)은 무시
-        if knee_angle < 60.0 or knee_angle > 200.0:
+        if angle < self.valid_range[0] or angle > self.valid_range[1]:
             return
 
-        # last_knee_angle 초기화
-        if self.last_knee_angle is None:
-            self.last_knee_angle = knee_angle
-            return
-
-        prev_angle = self.last_knee_angle
-        self.last_knee_angle = knee_angle
-
-        # 각도 변화 방향
-        moving_down = knee_angle < prev_angle
-        moving_up = knee_angle > prev_angle
-        motion_size = abs(knee_angle - prev_angle)
+        analysis = analysis or {}
+        self.buffer.push(angle, time.time() if t is None else t)
+        angle = self.buffer.mean_last(self.smooth_window)
+        self.last_angle = angle
 
         # 이번 프레임에 오류가 있으면 플래그
         if analysis.get("errorCodes"):
             self.current_rep_has_error = True
 
         if self.state == "top":
-            # top 상태에서는 down 관련 값 리셋
+            # top 상태에서는 down 관련 값 리셋, 봉우리 갱신
             self.current_rep_min_angle = 999.0
             self.down_frames = 0
+            self.peak_angle = angle if self.peak_angle is None else max(self.peak_angle, angle)
 
             # "진짜 내려가기 시작" 조건
-            if (moving_down and
-                motion_size >= self.min_motion_deg and
-                knee_angle < self.bottom_thr):
+            if (angle < self.bottom_thr and
+                self.peak_angle - angle >= self.min_motion_deg):
 
                 self.state = "down"
                 self.current_rep_has_error = bool(analysis.get("errorCodes"))
-                self.current_rep_min_angle = knee_angle
+                self.current_rep_min_angle = angle
                 self.down_frames = 1
 
         elif self.state == "down":
-            # 내려가는 구간에서 최소 각도 갱신
-            self.current_rep_min_angle = min(self.current_rep_min_angle, knee_angle)
+            # 내려가는 구간에서 골짜기(최소 각도) 갱신
+            self.current_rep_min_angle = min(self.current_rep_min_angle, angle)
 
             # 충분히 내려간 상태가 유지되는 프레임 카운트
-            if knee_angle < self.bottom_thr:
+            if angle < self.bottom_thr:
                 self.down_frames += 1
 
             # "다시 올라와서 1회 완료" 조건
-            if (moving_up and
-                motion_size >= self.min_motion_deg and
-                knee_angle > self.top_thr and
+            if (angle > self.top_thr and
+                angle - self.current_rep_min_angle >= self.min_motion_deg and
                 self.down_frames >= self.min_down_frames):
 
                 self.state = "top"
@@ -538,52 +696,348 @@ class RepCounter:
                 self.current_rep_has_error = False
                 self.current_rep_min_angle = 999.0
                 self.down_frames = 0
+                self.peak_angle = angle
 
     def as_dict(self):
         return {
             "name": self.name,
+            "type": "rep",
             "total": self.total_reps,
             "correct": self.correct_reps,
             "wrong": self.wrong_reps,
         }
 
-# 스쿼트 / 런지 반복 카운터 (왼쪽 무릎 각도 기준)
-SQUAT_COUNTER = RepCounter(top_thr=150.0, bottom_thr=110.0, name="squat")
-LUNGE_COUNTER = RepCounter(top_thr=150.0, bottom_thr=110.0, name="lunge")
+# ================== 유지(Hold) 타이머 ==================
+class HoldTimer:
+    """
+    플랭크 등 정적 운동의 자세 유지 시간 측정기
+    - angle이 [low, high] 구간 안이면 유지 중으로 판단
+    - grace_sec 이내의 짧은 이탈/인식 실패는 유지로 간주
+    - min_hold_sec 이상 유지된 구간만 1회로 기록
+    """
+    def __init__(
+        self,
+        low: float,
+        high: float,
+        name: str = "unknown",
+        min_hold_sec: float = 1.0,
+        grace_sec: float = 0.5,
+        valid_range: tuple = (30.0, 200.0),
+        smooth_window: int = 3,
+        buffer_size: int = 64
+    ):
+        self.name = name
+        self.low = low
+        self.high = high
+        self.min_hold_sec = min_hold_sec
+        self.grace_sec = grace_sec
+        self.valid_range = valid_range
+        self.smooth_window = smooth_window
+
+        self.buffer = AngleRingBuffer(buffer_size)
+        self.last_angle = None
+        self.hold_start = None     # 현재 유지 시작 시각
+        self.last_ok_time = None   # 마지막으로 자세가 맞았던 시각
+        self.current_hold = 0.0
+        self.current_hold_has_error = False
+
+        self.holds = 0
+        self.correct_holds = 0
+        self.wrong_holds = 0
+        self.best_hold = 0.0
+        self.total_hold = 0.0
+
+    def update(self, angle: float, analysis: dict = None, t: float = None):
+        """매 프레임마다 호출 - 각도를 못 구한 프레임도 호출해야 유지 종료를 판단할 수 있음"""
+        t = time.time() if t is None else t
+        analysis = analysis or {}
+
+        if (angle is None or math.isnan(angle) or
+                angle < self.valid_range[0] or angle > self.valid_range[1]):
+            self._check_grace(t)
+            return
+
+        self.buffer.push(angle, t)
+        angle = self.buffer.mean_last(self.smooth_window)
+        self.last_angle = angle
+
+        if self.low <= angle <= self.high:
+            if self.hold_start is None:
+                self.hold_start = t
+                self.current_hold_has_error = False
+            self.last_ok_time = t
+            self.current_hold = t - self.hold_start
+            if analysis.get("errorCodes"):
+                self.current_hold_has_error = True
+        else:
+            self._check_grace(t)
+
+    def _check_grace(self, t: float):
+        if self.hold_start is not None and t - self.last_ok_time > self.grace_sec:
+            self._finish_hold()
+
+    def _finish_hold(self):
+        """현재 유지 구간 종료 및 기록"""
+        if self.current_hold >= self.min_hold_sec:
+            self.holds += 1
+            self.total_hold += self.current_hold
+            self.best_hold = max(self.best_hold, self.current_hold)
+            if self.current_hold_has_error:
+                self.wrong_holds += 1
+            else:
+                self.correct_holds += 1
+        self.hold_start = None
+        self.last_ok_time = None
+        self.current_hold = 0.0
+        self.current_hold_has_error = False
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "type": "hold",
+            "holding": self.hold_start is not None,
+            "current_sec": round(self.current_hold, 1),
+            "best_sec": round(max(self.best_hold, self.current_hold), 1),
+            "total_sec": round(self.total_hold + self.current_hold, 1),
+            "total": self.holds,
+            "correct": self.correct_holds,
+            "wrong": self.wrong_holds,
+        }
 
-def _compute_left_knee_angle_from_landmarks(lms: list):
-    """landmarks 리스트(dict들)에서 왼쪽 무릎 각도 계산"""
-    PL = mp_pose.PoseLandmark
-    try:
-        lh = lms[PL.LEFT_HIP.value]
-        lk = lms[PL.LEFT_KNEE.value]
-        la = lms[PL.LEFT_ANKLE.value]
+# ================== 운동별 검출기 설정 ==================
+# 스코어링은 기본 자세(standing)를 쓰지만 반복 검출은 별도로 하는 운동
+EXERCISE_DETECTOR_MAPPING = {
+    "005": "chair_dip",
+    "006": "mountain_climber",
+}
 
-        a = (lh["x"], lh["y"], lh.get("z", 0.0))
-        b = (lk["x"], lk["y"], lk.get("z", 0.0))
-        c = (la["x"], la["y"], la.get("z", 0.0))
+EXERCISE_DETECTOR_PARAMS = {
+    "squat": {
+        "type": "rep",
+        "joints": ["left_knee", "right_knee"],
+        "reduce": "mean",
+        "top_thr": 150.0,
+        "bottom_thr": 110.0
+    },
+    "lunge": {
+        "type": "rep",
+        "joints": ["left_knee", "right_knee"],
+        "reduce": "min",        # 앞다리(더 많이 굽힌 쪽) 기준
+        "top_thr": 150.0,
+        "bottom_thr": 110.0
+    },
+    "pushup": {
+        "type": "rep",
+        "joints": ["left_elbow", "right_elbow"],
+        "reduce": "mean",
+        "top_thr": 150.0,
+        "bottom_thr": 105.0,
+        "valid_range": (30.0, 200.0)
+    },
+    "chair_dip": {
+        "type": "rep",
+        "joints": ["left_elbow", "right_elbow"],
+        "reduce": "mean",
+        "top_thr": 150.0,
+        "bottom_thr": 110.0,
+        "valid_range": (30.0, 200.0)
+    },
+    "mountain_climber": {
+        "type": "rep",
+        "joints": ["left_hip", "right_hip"],
+        "reduce": "min",        # 당겨온 쪽 다리 기준
+        "top_thr": 145.0,
+        "bottom_thr": 110.0,
+        "min_down_frames": 2,
+        "valid_range": (30.0, 200.0)
+    },
+    "plank": {
+        "type": "hold",
+        "joints": ["left_body_line", "right_body_line"],
+        "reduce": "mean",
+        "low": 160.0,
+        "high": 200.0
+    },
+}
 
-        return _angle_deg_3d(a, b, c)
-    except Exception:
+def create_detector(detector_key: str):
+    """운동별 설정으로 RepCounter 또는 HoldTimer 생성 (설정이 없으면 None)"""
+    cfg = EXERCISE_DETECTOR_PARAMS.get(detector_key)
+    if cfg is None:
         return None
+    kwargs = {k: v for k, v in cfg.items() if k not in ("type", "joints", "reduce")}
+    if cfg["type"] == "hold":
+        return HoldTimer(name=detector_key, **kwargs)
+    return RepCounter(name=detector_key, **kwargs)
+
+def detector_angle_from_landmarks(detector_key: str, lms: list):
+    """검출기가 사용할 관절 각도 하나를 계산"""
+    cfg = EXERCISE_DETECTOR_PARAMS[detector_key]
+    angles = compute_joint_angles(lms, cfg["joints"])
+    return _reduce_angles(angles.values(), cfg["reduce"])
+
+def detector_angles_batch(detector_key: str, frames):
+    """detector_angle_from_landmarks의 배치 버전 - (T,) 각도 배열 반환"""
+    cfg = EXERCISE_DETECTOR_PARAMS[detector_key]
+    angles = compute_joint_angles_batch(frames, cfg["joints"])
+    return _reduce_angles_batch([angles[j] for j in cfg["joints"]], cfg["reduce"])
+
+def replay_detector(detector, angles, timestamps=None, analyses=None, fps=5.0):
+    """
+    녹화된 각도 시퀀스를 실시간과 같은 update 코드로 재생
+    - timestamps가 없으면 fps 간격으로 가정
+    - analyses: 프레임별 score_pose_components 결과 (없으면 오류 없음/점수 0으로 간주)
+    """
+    for i, angle in enumerate(angles):
+        t = timestamps[i] if timestamps is not None else i / fps
+        analysis = analyses[i] if analyses is not None else None
+        detector.update(None if angle is None or math.isnan(angle) else float(angle), analysis, t)
+    return detector.as_dict()
 
-def update_rep_for_exercise(exercise_code_str: str, landmarks: list, analysis: dict):
+# ================== 델타 응답 ==================
+DELTA_KEYFRAME_INTERVAL = 30   # 이 프레임 수마다 전체 응답(keyframe)을 보내 클라이언트 재동기화
+
+class DeltaEncoder:
     """
-    스쿼트/런지일 때만 반복 카운터 업데이트
-    - exercise_code_str: "squat", "lunge" 등 (이미 매핑된 문자열 기준)
+    세션별로 마지막에 보낸 analysis/rep 상태를 기억하고 바뀐 필드만 골라 보내는 인코더
+    - keyframe: 전체 analysis/rep 전송 (첫 프레임, 주기적, 클라이언트 요청 시)
+    - delta: analysis 중 값이 바뀐 키만, rep은 바뀐 경우에만 포함
+      ▷ 이전에 있었는데 사라진 analysis 키는 "removed" 목록으로 전달
+    - landmarks, next_interval_ms 등 analysis/rep 외의 필드는 매 프레임 바뀌므로 있으면 항상 포함
     """
-    knee_angle = _compute_left_knee_angle_from_landmarks(landmarks)
-    if knee_angle is None:
+    def __init__(self, keyframe_interval: int = DELTA_KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.frames_since_keyframe = 0
+        self.last_analysis = None
+        self.last_rep = None
+
+    def encode(self, content: dict, force_keyframe: bool = False):
+        analysis = content["analysis"]
+        rep = content.get("rep")
+
+        self.seq += 1
+        keyframe = (force_keyframe or
+                    self.last_analysis is None or
+                    self.frames_since_keyframe >= self.keyframe_interval)
+
+        if keyframe:
+            out = dict(content)
+            self.frames_since_keyframe = 0
+        else:
+            out = {k: v for k, v in content.items() if k not in ("analysis", "rep")}
+            out["analysis"] = {k: v for k, v in analysis.items()
+                               if k not in self.last_analysis or self.last_analysis[k] != v}
+            removed = [k for k in self.last_analysis if k not in analysis]
+            if removed:
+                out["removed"] = removed
+            if rep != self.last_rep:
+                out["rep"] = rep
+            self.frames_since_keyframe += 1
+
+        out["seq"] = self.seq
+        out["keyframe"] = keyframe
+        self.last_analysis = analysis
+        self.last_rep = rep
+        return out
+
+    def __getstate__(self):
+        # 세션 스냅샷에는 seq만 남김 - 복원 후 첫 응답은 keyframe (클라이언트 상태와 어긋나지 않게)
+        state = dict(self.__dict__)
+        state["last_analysis"] = None
+        state["last_rep"] = None
+        return state
+
+# ================== 세션 상태 ==================
+SESSION_IDLE_TIMEOUT = 600.0    # 10분간 요청이 없으면 세션 정리
+SESSION_SWEEP_INTERVAL = 60.0   # 정리 주기
+
+class SessionState:
+    """클라이언트 세션(또는 다인원 모드의 한 사람) 상태 - 반복/유지 검출기, 오류 알림 타이머, 델타 응답 상태"""
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.detectors = {}
+        self.delta = DeltaEncoder()
+        self.device = DeviceStatePublisher(session_id)
+        self.alerts = create_alert_trackers(self.device)
+        self.decode_flags = None   # 세션 해상도에 맞춘 imdecode 플래그 (첫 프레임 후 결정)
+        self.tracker = None        # 다인원 모드에서만 사용 (PersonTracker)
+        self.last_seen = time.time()
+
+    def get_detector(self, detector_key: str):
+        if detector_key not in self.detectors:
+            self.detectors[detector_key] = create_detector(detector_key)
+        return self.detectors[detector_key]
+
+    def __setstate__(self, state):
+        # 세션 스냅샷 복원 - 오류 추적기의 알림 콜백을 이 세션의 기기 발행기에 다시 연결
+        self.__dict__.update(state)
+        for part, tracker in self.alerts.items():
+            tracker.send_alert = functools.partial(self.device.request_alert, part)
+
+SESSIONS = {}
+_last_session_sweep = 0.0
+_sessions_version = 0   # 세션을 조회/생성/정리할 때마다 증가 (스냅샷에서 변경 여부 판단)
+
+def get_session(session_id: str):
+    """세션 조회/생성 + 오래된 세션 주기적 정리"""
+    global _last_session_sweep, _sessions_version
+
+    _sessions_version += 1
+    now = time.time()
+    if now - _last_session_sweep >= SESSION_SWEEP_INTERVAL:
+        _last_session_sweep = now
+        expired = [sid for sid, s in SESSIONS.items() if now - s.last_seen > SESSION_IDLE_TIMEOUT]
+        for sid in expired:
+            del SESSIONS[sid]
+
+    session = SESSIONS.get(session_id)
+    if session is None:
+        session = SessionState(session_id)
+        SESSIONS[session_id] = session
+    session.last_seen = now
+    return session
+
+def update_rep_for_exercise(session: SessionState, detector_key: str, landmarks: list, analysis: dict, t: float = None):
+    """
+    운동별 반복/유지 검출기 업데이트
+    - detector_key: "squat", "plank", "chair_dip" 등 (EXERCISE_DETECTOR_PARAMS 키)
+    """
+    detector = session.get_detector(detector_key)
+    if detector is None:
         return None
 
-    if exercise_code_str == "squat":
-        SQUAT_COUNTER.update(knee_angle, analysis)
-        return SQUAT_COUNTER.as_dict()
-    elif exercise_code_str == "lunge":
-        LUNGE_COUNTER.update(knee_angle, analysis)
-        return LUNGE_COUNTER.as_dict()
-    else:
+    angle = detector_angle_from_landmarks(detector_key, landmarks)
+    detector.update(angle, analysis, t)
+    return detector.as_dict()
+
+def update_alerts(session: SessionState, analysis: dict = None, t: float = None):
+    """
+    부위별 오류 지속시간 체크 (왼팔 → 오른팔 → 왼쪽 다리 → 오른쪽 다리) 후 상태가 바뀌었으면 한 번만 발행
+    - analysis가 None이면(사람/필수 부위가 안 보임) 모든 부위를 오류 없음으로 처리
+      ▷ 기기의 active 비트가 사용자가 화면을 벗어난 뒤에도 켜진 채로 남지 않게 함
+    """
+    now = time.time() if t is None else t
+    active = 0
+    for part, tracker in session.alerts.items():
+        tracker.check(analysis is not None and analysis.get(f"{part}_bad", False), now)
+        if tracker.is_sustained(now):
+            active |= LIMB_BITS[part]
+    session.device.flush(active, now)
+
+def update_rep_without_pose(session: SessionState, detector_key: str, t: float = None, clear_alerts: bool = False):
+    """
+    포즈/필수 부위를 찾지 못한 프레임 - 각도 없이 검출기 업데이트
+    - HoldTimer는 이런 프레임을 받아야 grace_sec이 지난 유지를 끝낼 수 있음 (RepCounter는 무시)
+    - clear_alerts: 부위별 오류 추적기도 오류 없음으로 업데이트하고 기기 active 상태 해제
+    """
+    if clear_alerts:
+        update_alerts(session, None, t)
+    detector = session.get_detector(detector_key)
+    if detector is None:
         return None
+    detector.update(None, None, t)
+    return detector.as_dict()
 
 def score_pose_components(lms, exercise_code="standing"):
     """포즈 분석 함수 - 팀원 수정사항 반영"""
@@ -748,21 +1202,435 @@ def score_pose_components(lms, exercise_code="standing"):
         "right_arm_bad": right_arm_bad  # 오른팔 오류 상태 추가
     }
 
+# ================== 프로파일링 (디버그) ==================
+DEBUG_TOKEN = os.environ.get("FITAI_DEBUG_TOKEN")   # 설정하지 않으면 디버그 엔드포인트 비활성화
+PROFILE_MAX_SECONDS = 300.0
+PROFILE_MAX_FRAMES = 10000
+PROFILE_MAX_TOP = 100
+
+class ProfileRun:
+    """
+    analyze_pose 계열 요청에 대한 CPU 프로파일(cProfile) + 메모리 할당(tracemalloc) 측정 한 번
+    - 요청을 처리하는 동안에만 cProfile을 켜서 다른 엔드포인트는 섞이지 않음
+      ▷ 단, 다인원 요청이 워커 스레드를 await하는 동안 이벤트 루프가 처리한 다른 요청은 포함될 수 있음
+    - cProfile은 켠 스레드만 기록하므로, 워커 스레드 작업(다인원 인물 검출/포즈 추정)은 profile_call로
+      스레드별 프로파일을 따로 떠서 종료 시 합침
+    - 함수별 시간은 스레드별 wall time의 합 (MediaPipe 내부 스레드 대기도 process 호출 시간으로 보이도록)
+      ▷ 여러 스레드의 시간을 합치면 병렬 구간/대기가 중복되므로 프레임당 시간은 핸들러 전체 wall time으로 따로 측정
+    - tracemalloc은 프로세스 전체를 추적하므로 측정 중에는 다른 요청의 할당도 포함될 수 있음
+    """
+    def __init__(self, seconds: float, frames: int, top: int):
+        self.profiler = cProfile.Profile()
+        self.thread_profilers = []
+        self.handler_sec = 0.0   # profiled 핸들러의 wall time 합 (프레임당 시간 계산용)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.deadline = self.started_at + seconds
+        self.max_frames = frames
+        self.top = top
+        self.frames = 0
+        self.finished_at = None
+        self.path = None
+        self.summary = None
+
+        tracemalloc.start()
+        self.start_snapshot = tracemalloc.take_snapshot()
+
+    def is_done(self):
+        return self.frames >= self.max_frames or time.time() >= self.deadline
+
+    def profile_call(self, fn, *args):
+        """워커 스레드에서 fn(*args)를 이 스레드 전용 cProfile로 측정"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+는 프로파일러를 프로세스에 하나만 켤 수 있음 → 측정 없이 실행
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.thread_profilers.append(profiler)
+
+    def finish(self):
+        snapshot = tracemalloc.take_snapshot()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.finished_at = time.time()
+
+        fd, self.path = tempfile.mkstemp(prefix="fitai_profile_", suffix=".prof")
+        os.close(fd)
+        stats = pstats.Stats(self.profiler)
+        with self.lock:
+            for profiler in self.thread_profilers:
+                stats.add(profiler)
+        stats.dump_stats(self.path)
+
+        rows = []
+        for (filename, lineno, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+            rows.append({
+                "function": f"{func} ({os.path.basename(filename)}:{lineno})",
+                "calls": nc,
+                "self_ms": round(tt * 1000.0, 3),
+                "cumulative_ms": round(ct * 1000.0, 3),
+            })
+        frames = max(1, self.frames)
+        hottest = sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:self.top]
+        cumulative = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:self.top]
+
+        allocations = [{
+            "site": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+            "size_kb": round(s.size_diff / 1e3, 1),
+            "count": s.count_diff,
+        } for s in snapshot.compare_to(self.start_snapshot, "lineno")[:self.top]]
+
+        self.summary = {
+            "frames": self.frames,
+            "duration_sec": round(self.finished_at - self.started_at, 2),
+            "wall_ms_per_frame": round(self.handler_sec * 1000.0 / frames, 3),
+            "traced_peak_kb": round(traced_peak / 1e3, 1),
+            "traced_current_kb": round(traced_current / 1e3, 1),
+            "hottest_functions": hottest,
+            "cumulative_functions": cumulative,
+            "allocation_sites": allocations,
+        }
+        print(f"📊 프로파일 완료 - {self.frames}프레임, 저장: {self.path}")
+
+    def status(self):
+        if self.summary is not None:
+            return {"running": False, **self.summary}
+        return {
+            "running": True,
+            "frames": self.frames,
+            "max_frames": self.max_frames,
+            "remaining_sec": round(max(0.0, self.deadline - time.time()), 1),
+        }
+
+_active_profile = None   # 측정 중인 ProfileRun (없으면 None → 요청 처리에 추가 비용 없음)
+_last_profile = None
+
+def _finish_profile():
+    global _active_profile, _last_profile
+    run = _active_profile
+    _active_profile = None
+    run.finish()
+    _last_profile = run
+
+def profiled(handler):
+    """분석 엔드포인트용 데코레이터 - 프로파일링 중일 때만 cProfile을 켜고, 아니면 바로 호출"""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        run = _active_profile
+        if run is None:
+            return await handler(*args, **kwargs)
+
+        run.profiler.enable()
+        t0 = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            run.profiler.disable()
+            run.handler_sec += time.perf_counter() - t0
+            run.frames += 1
+            if run.is_done() and _active_profile is run:
+                _finish_profile()
+    return wrapper
+
+def _debug_guard(token: Optional[str]):
+    """디버그 엔드포인트 접근 확인 - 통과하면 None, 아니면 에러 응답"""
+    if not DEBUG_TOKEN:
+        return JSONResponse(content={"success": False, "error": "Not Found"}, status_code=404)
+    # str끼리 비교하면 ASCII가 아닌 헤더 값에서 TypeError → bytes로 비교
+    if token is None or not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+        return JSONResponse(content={"success": False, "error": "Forbidden"}, status_code=403)
+    return None
+
+class ProfileRequest(BaseModel):
+    seconds: float = 10.0
+    frames: int = 200
+    top: int = 20
+
+@app.post("/api/debug/profile")
+async def start_profile(request: ProfileRequest, x_debug_token: Optional[str] = Header(None)):
+    """analyze_pose 계열 요청을 seconds초 또는 frames프레임 동안 프로파일링 시작"""
+    global _active_profile
+
+    denied = _debug_guard(x_debug_token)
+    if denied:
+        return denied
+
+    if _active_profile is not None:
+        if not _active_profile.is_done():
+            return JSONResponse(content={
+                "success": False,
+                "error": "이미 프로파일링 중입니다",
+                "profile": _active_profile.status()
+            }, status_code=409)
+        _finish_profile()
+
+    # 이전 결과 파일은 새 측정을 시작할 때 정리
+    if _last_profile is not None and _last_profile.path is not None:
+        try:
+            os.remove(_last_profile.path)
+        except OSError:
+            pass
+        _last_profile.path = None
+
+    _active_profile = ProfileRun(
+        seconds=min(max(request.seconds, 0.1), PROFILE_MAX_SECONDS),
+        frames=min(max(request.frames, 1), PROFILE_MAX_FRAMES),
+        top=min(max(request.top, 1), PROFILE_MAX_TOP)
+    )
+    print(f"📊 프로파일 시작 - 최대 {request.seconds}초 / {request.frames}프레임")
+    return {"success": True, "profile": _active_profile.status()}
+
+@app.get("/api/debug/profile")
+async def profile_status(x_debug_token: Optional[str] = Header(None)):
+    """진행 상태 또는 마지막 결과 요약 (가장 오래 걸린 함수, 할당 위치 top-N)"""
+    denied = _debug_guard(x_debug_token)
+    if denied:
+        return denied
+
+    # 요청이 끊겨 마감 시간이 지났으면 여기서 마무리
+    if _active_profile is not None and _active_profile.is_done():
+        _finish_profile()
+
+    run = _active_profile or _last_profile
+    if run is None:
+        return JSONResponse(content={"success": False, "error": "프로파일 기록이 없습니다"}, status_code=404)
+    return {"success": True, "profile": run.status()}
+
+@app.post("/api/debug/profile/stop")
+async def stop_profile(x_debug_token: Optional[str] = Header(None)):
+    """진행 중인 프로파일링을 바로 종료"""
+    denied = _debug_guard(x_debug_token)
+    if denied:
+        return denied
+
+    if _active_profile is None:
+        return JSONResponse(content={"success": False, "error": "진행 중인 프로파일이 없습니다"}, status_code=404)
+    _finish_profile()
+    return {"success": True, "profile": _last_profile.status()}
+
+@app.get("/api/debug/profile/download")
+async def download_profile(x_debug_token: Optional[str] = Header(None)):
+    """마지막 프로파일 파일(pstats 형식, snakeviz 등으로 열람) 다운로드"""
+    denied = _debug_guard(x_debug_token)
+    if denied:
+        return denied
+
+    if _last_profile is None or _last_profile.path is None:
+        return JSONResponse(content={"success": False, "error": "프로파일 기록이 없습니다"}, status_code=404)
+    return FileResponse(_last_profile.path, media_type="application/octet-stream",
+                        filename=os.path.basename(_last_profile.path))
+
+# ================== 프레임 간격 힌트 ==================
+FRAME_INTERVAL_DEFAULT_MS = 200    # 프론트엔드 기존 고정 전송 간격
+FRAME_INTERVAL_MIN_MS = 100
+FRAME_INTERVAL_MAX_MS = 600        # 가만히 서 있을 때도 움직임 시작을 놓치지 않는 상한
+FRAME_HOLD_INTERVAL_MS = 400       # 유지 중인 정적 자세 (HoldTimer grace_sec 0.5초보다 짧게)
+FRAME_TARGET_DEG_PER_FRAME = 15.0  # 프레임 사이 각도 변화 목표 (고정 200ms에서 빠른 스쿼트는 프레임당 20~30도)
+FRAME_RATE_WINDOW = 3              # 각속도 계산에 쓰는 최근 프레임 수
+
+LOAD_WINDOW_SEC = 2.0              # 서버 사용률 측정 구간
+LOAD_TARGET_UTILIZATION = 0.7      # 이 이상 바쁘면 간격을 비례해서 늘림
+
+class ServerLoad:
+    """
+    프로세스의 분석 요청 처리 사용률(구간 내 처리 시간 합 / 구간 길이)
+    - 핸들러는 이벤트 루프에서 순서대로 실행되므로 처리 시간 합은 구간 길이를 넘지 못함 → 사용률은 최대 약 1
+      ▷ factor()도 최대 약 1/LOAD_TARGET_UTILIZATION(≈1.43)배까지만 올라감
+    - 핸들러가 시작되기 전에 줄 서서 기다린 시간(소켓 backlog, 이벤트 루프 대기)은 프로세스 안에서 보이지 않으므로
+      사용률이 1에 붙은 뒤의 과부하 정도는 구분하지 못함 - "거의 포화" 신호로만 사용
+    """
+    def __init__(self, window: float = LOAD_WINDOW_SEC):
+        self.window = window
+        self.window_start = time.perf_counter()
+        self.busy = 0.0
+        self.utilization = 0.0
+
+    def observe(self, seconds: float):
+        self.busy += seconds
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed >= self.window:
+            self.utilization = self.busy / elapsed
+            self.window_start = now
+            self.busy = 0.0
+
+    def factor(self):
+        """목표 사용률을 넘은 만큼 전송 간격을 늘리는 배수 (1 ~ 약 1.43)"""
+        return max(1.0, self.utilization / LOAD_TARGET_UTILIZATION)
+
+SERVER_LOAD = ServerLoad()
+
+def recommend_frame_interval(detector) -> int:
+    """
+    다음 프레임까지 권장 전송 간격(ms)
+    - 반복 운동: 최근 각속도로 프레임 사이 각도 변화가 FRAME_TARGET_DEG_PER_FRAME 정도가 되게 하고,
+      내려간 상태이거나 아직 top_thr 위로 올라오지 않았으면 기본 간격보다 길게 하지 않음 (min_down_frames 확보)
+    - 유지 운동: 자세를 유지하는 동안만 FRAME_HOLD_INTERVAL_MS
+    - 서버 사용률이 높으면 모든 세션의 간격을 같은 배수(최대 약 1.43)로 늘림
+    """
+    if isinstance(detector, RepCounter):
+        speed = abs(detector.buffer.rate_last(FRAME_RATE_WINDOW) or 0.0)
+        interval = 1000.0 * FRAME_TARGET_DEG_PER_FRAME / speed if speed > 0 else FRAME_INTERVAL_MAX_MS
+        in_rep = (detector.state == "down" or
+                  (detector.last_angle is not None and detector.last_angle < detector.top_thr))
+        if in_rep:
+            interval = min(interval, FRAME_INTERVAL_DEFAULT_MS)
+    elif isinstance(detector, HoldTimer):
+        interval = FRAME_HOLD_INTERVAL_MS if detector.hold_start is not None else FRAME_INTERVAL_DEFAULT_MS
+    else:
+        interval = FRAME_INTERVAL_DEFAULT_MS
+
+    interval *= SERVER_LOAD.factor()
+    return int(min(FRAME_INTERVAL_MAX_MS, max(FRAME_INTERVAL_MIN_MS, interval)))
+
+# ================== 프레임 디코딩 ==================
+MAX_DECODE_WIDTH = 960   # 이보다 넓은 프레임은 JPEG 축소 디코딩 (포즈 모델 입력은 256x256)
+
+# OpenCV 4.11+는 RGB로 바로 디코딩 가능, 이전 버전은 BGR 디코딩 후 제자리 변환
+_IMREAD_COLOR_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+_DECODE_FULL = _IMREAD_COLOR_RGB if _IMREAD_COLOR_RGB is not None else cv2.IMREAD_COLOR
+_DECODE_REDUCED = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+}
+
+def _choose_decode_flags(width: int):
+    """전체 해상도 프레임 폭을 보고 축소 디코딩 비율 결정 (축소 후에도 MAX_DECODE_WIDTH/2 이상 유지)"""
+    if width <= MAX_DECODE_WIDTH:
+        return _DECODE_FULL
+    for factor in (4, 2):
+        if width // factor >= MAX_DECODE_WIDTH // 2:
+            return _DECODE_REDUCED[factor]
+    return _DECODE_FULL
+
+def decode_frame_rgb(image_data_url: str, session: SessionState):
+    """
+    base64(data URL) 프레임 → 포즈 추론용 RGB 배열
+    - 접두어 이후 base64 문자열은 슬라이스로 한 번 복사됨 (a2b_base64는 시작 오프셋을 받지 않음), np.frombuffer는 복사 없음
+    - 가능하면 RGB로 바로 디코딩, 아니면 디코딩한 버퍼에서 제자리 색 변환 (두 번째 전체 프레임 복사 없음)
+    - 세션의 첫 프레임 해상도를 보고, 큰 프레임은 이후 JPEG 축소 디코딩 (landmarks는 정규화 좌표라 결과 좌표계는 동일)
+    - MediaPipe가 복사 없이 참조하도록 읽기 전용으로 표시
+    """
+    start = image_data_url.find(",") + 1
+    image_data = binascii.a2b_base64(image_data_url[start:])
+    nparr = np.frombuffer(image_data, np.uint8)
+
+    flags = session.decode_flags if session.decode_flags is not None else _DECODE_FULL
+    image = cv2.imdecode(nparr, flags)
+    if image is None:
+        raise ValueError("이미지를 디코딩할 수 없습니다")
+
+    if flags != _IMREAD_COLOR_RGB:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+    if session.decode_flags is None:
+        session.decode_flags = _choose_decode_flags(image.shape[1])
+
+    image.flags.writeable = False
+    return image
+
+REQUIRED_LANDMARKS = [0, 11, 12, 23, 24]   # 얼굴, 양 어깨, 양 골반 - 하나라도 안 보이면 분석하지 않음
+REQUIRED_MIN_VISIBILITY = 0.5
+
+def analyze_landmarks(session: SessionState, exercise_code: str, detector_key: str, landmarks: list, t: float = None):
+    """
+    랜드마크(dict 33개) 한 프레임 분석 - 가시성 체크, 점수 계산, IoT 알림, 반복/유지 검출
+    - analyze_pose(이미지)와 analyze_landmarks_api(클라이언트 랜드마크)가 공통으로 사용
+    - t: 프레임 시각 (None이면 현재 시각)
+    - next_interval_ms: 클라이언트가 다음 프레임을 보낼 권장 간격 (recommend_frame_interval)
+    """
+    missing_parts = []
+    for idx in REQUIRED_LANDMARKS:
+        if landmarks[idx]['visibility'] < REQUIRED_MIN_VISIBILITY:
+            missing_parts.append(idx)
+
+    if missing_parts:
+        part_names = {
+            0: "얼굴",
+            11: "왼쪽 어깨",
+            12: "오른쪽 어깨",
+            23: "왼쪽 골반",
+            24: "오른쪽 골반"
+        }
+        missing_names = [part_names.get(idx, f"부위{idx}") for idx in missing_parts]
+
+        return {
+            "success": True,
+            "landmarks": landmarks,
+            "analysis": {
+                "score": 0,
+                "components": {
+                    "shoulders_level": 0,
+                    "hips_level": 0,
+                    "spine_vertical": 0,
+                    "elbows_angle": 0
+                },
+                "visibility_weight": 0,
+                "errorCodes": [],
+                "hints": [
+                    f"카메라에서 {', '.join(missing_names)}이(가) 보이지 않습니다",
+                    "전신이 보이도록 카메라 위치를 조정해주세요"
+                ]
+            },
+            "rep": update_rep_without_pose(session, detector_key, t, clear_alerts=True),
+            "next_interval_ms": recommend_frame_interval(None)
+        }
+
+    analysis = score_pose_components(landmarks, exercise_code)
+    print(f"✅ 사용한 파라미터: '{analysis['exercise_code']}'")
+
+    # ============= IoT 신호 전송 처리 =============
+    update_alerts(session, analysis, t)
+    # ============= IoT 처리 끝 =============
+
+    # ============= 반복 수 / 유지 시간 업데이트 =============
+    rep_info = update_rep_for_exercise(session, detector_key, landmarks, analysis, t)
+    if rep_info and rep_info["type"] == "hold":
+        print(
+            f"⏱️ 자세 유지 정보({rep_info['name']}): "
+            f"현재 {rep_info['current_sec']}초 / 최고 {rep_info['best_sec']}초 / 누적 {rep_info['total_sec']}초"
+        )
+    elif rep_info:
+        print(
+            f"🔁 운동 반복 정보({rep_info['name']}): "
+            f"총 {rep_info['total']}회 / 정확 {rep_info['correct']}회 / 틀린 {rep_info['wrong']}회"
+        )
+    # ============= 반복 수 처리 끝 =============
+
+    return {
+        "success": True,
+        "landmarks": landmarks,
+        "analysis": analysis,
+        "rep": rep_info,
+        "next_interval_ms": recommend_frame_interval(session.get_detector(detector_key))
+    }
+
 @app.post("/api/analyze-pose")
+@profiled
 async def analyze_pose(request: PoseAnalysisRequest):
+    t0 = time.perf_counter()
     try:
+        error = _delta_session_error(request)
+        if error is not None:
+            return error
+
         # 팀원 수정사항: exercise_code 변환 로직 개선
         exercise_code = EXERCISE_CODE_MAPPING.get(request.exercise_code, request.exercise_code.lower())
+        detector_key = EXERCISE_DETECTOR_MAPPING.get(request.exercise_code, exercise_code)
         print(f"🔍 받은 exercise_code: '{request.exercise_code}' → 변환: '{exercise_code}'")
+        session = get_session(request.session_id)
         
-        image_data = base64.b64decode(request.image.split(',')[1] if ',' in request.image else request.image)
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = pose.process(image_rgb)
+        image_rgb = decode_frame_rgb(request.image, session)
+        results = get_pose().process(image_rgb)
         
         if not results.pose_landmarks:
+            update_rep_without_pose(session, detector_key, clear_alerts=True)
             return JSONResponse(content={"success": False, "message": "No pose detected"})
         
         landmarks = []
@@ -774,88 +1642,616 @@ async def analyze_pose(request: PoseAnalysisRequest):
                 "visibility": landmark.visibility
             })
         
-        required_landmarks = [0, 11, 12, 23, 24]
-        min_visibility = 0.5
-        
-        missing_parts = []
-        for idx in required_landmarks:
-            if landmarks[idx]['visibility'] < min_visibility:
-                missing_parts.append(idx)
+        content = analyze_landmarks(session, exercise_code, detector_key, landmarks)
+        if request.delta:
+            content = session.delta.encode(content, request.keyframe)
+        return JSONResponse(content=content)
         
-        if missing_parts:
-            part_names = {
-                0: "얼굴",
-                11: "왼쪽 어깨",
-                12: "오른쪽 어깨",
-                23: "왼쪽 골반",
-                24: "오른쪽 골반"
-            }
-            missing_names = [part_names.get(idx, f"부위{idx}") for idx in missing_parts]
-            
+    except Exception as e:
+        print(f"❌ 오류 발생: {str(e)}")
+        return JSONResponse(content={
+            "success": False,
+            "message": str(e)
+        }, status_code=500)
+    finally:
+        SERVER_LOAD.observe(time.perf_counter() - t0)
+
+# ================== 랜드마크 직접 분석 ==================
+LANDMARK_COUNT = 33          # MediaPipe Pose 랜드마크 수
+MAX_LANDMARK_FRAMES = 30     # 요청 하나에 담을 수 있는 최대 프레임 수
+
+def _landmarks_from_array(frame):
+    """[x, y, z(, visibility)] 배열 33개 → landmarks dict 리스트"""
+    if len(frame) != LANDMARK_COUNT:
+        raise ValueError(f"랜드마크는 {LANDMARK_COUNT}개여야 합니다 (받은 개수: {len(frame)})")
+
+    landmarks = []
+    for p in frame:
+        if len(p) < 3:
+            raise ValueError("랜드마크는 [x, y, z, visibility] 형식이어야 합니다")
+        landmarks.append({
+            "x": p[0],
+            "y": p[1],
+            "z": p[2],
+            "visibility": p[3] if len(p) > 3 else 1.0
+        })
+    return landmarks
+
+@app.post("/api/analyze-landmarks")
+@profiled
+async def analyze_landmarks_api(request: LandmarkAnalysisRequest):
+    """
+    클라이언트(브라우저 등)에서 계산한 랜드마크로 바로 분석 - 이미지 디코딩/포즈 추론 생략
+    - 여러 프레임을 한 번에 받아 순서대로 처리하고 프레임별 결과 반환
+      ▷ 여러 프레임이면 timestamps 필수 - 모두 같은 시각으로 처리하면 유지 시간/오류 지속시간/각속도가 0이 됨
+    - 응답에는 landmarks를 다시 넣지 않음 (클라이언트가 이미 가지고 있음)
+    """
+    t0 = time.perf_counter()
+    try:
+        error = _delta_session_error(request)
+        if error is not None:
+            return error
+
+        if len(request.frames) > MAX_LANDMARK_FRAMES:
             return JSONResponse(content={
-                "success": True,
-                "landmarks": landmarks,
-                "analysis": {
-                    "score": 0,
-                    "components": {
-                        "shoulders_level": 0,
-                        "hips_level": 0,
-                        "spine_vertical": 0,
-                        "elbows_angle": 0
-                    },
-                    "visibility_weight": 0,
-                    "errorCodes": [],
-                    "hints": [
-                        f"카메라에서 {', '.join(missing_names)}이(가) 보이지 않습니다",
-                        "전신이 보이도록 카메라 위치를 조정해주세요"
-                    ]
-                },
-                "rep": None
-            })
-        
-        analysis = score_pose_components(landmarks, exercise_code)
-        print(f"✅ 사용한 파라미터: '{analysis['exercise_code']}'")
-        
-        # ============= IoT 신호 전송 처리 =============
-        # 왼팔 오류 지속시간 체크 (지속시간 기반)
-        left_arm_has_error = analysis.get("left_arm_bad", False)
-        check_left_arm_error_duration(left_arm_has_error)
-        
-        # 오른팔 오류 지속시간 체크 (지속시간 기반)
-        right_arm_has_error = analysis.get("right_arm_bad", False)
-        check_right_arm_error_duration(right_arm_has_error)
-            
-        # 왼쪽 다리 오류 지속시간 체크 (지속시간 기반)
-        left_leg_has_error = analysis.get("left_leg_bad", False)
-        check_left_leg_error_duration(left_leg_has_error)
-        
-        # 오른쪽 다리 오류 지속시간 체크 (지속시간 기반)
-        right_leg_has_error = analysis.get("right_leg_bad", False)
-        check_right_leg_error_duration(right_leg_has_error)
-        # ============= IoT 처리 끝 =============
-
-        # ============= 스쿼트 / 런지 반복 수 업데이트 =============
-        rep_info = update_rep_for_exercise(exercise_code, landmarks, analysis)
-        if rep_info:
-            print(
-                f"🔁 운동 반복 정보({rep_info['name']}): "
-                f"총 {rep_info['total']}회 / 정확 {rep_info['correct']}회 / 틀린 {rep_info['wrong']}회"
-            )
-        # ============= 반복 수 처리 끝 =============
-        
+                "success": False,
+                "message": f"한 번에 최대 {MAX_LANDMARK_FRAMES}프레임까지 보낼 수 있습니다"
+            }, status_code=400)
+
+        if request.timestamps is None and len(request.frames) > 1:
+            return JSONResponse(content={
+                "success": False,
+                "message": "여러 프레임을 보낼 때는 프레임별 timestamps가 필요합니다"
+            }, status_code=400)
+
+        if request.timestamps is not None and len(request.timestamps) != len(request.frames):
+            return JSONResponse(content={
+                "success": False,
+                "message": "timestamps 개수가 frames 개수와 다릅니다"
+            }, status_code=400)
+
+        exercise_code = EXERCISE_CODE_MAPPING.get(request.exercise_code, request.exercise_code.lower())
+        detector_key = EXERCISE_DETECTOR_MAPPING.get(request.exercise_code, exercise_code)
+        session = get_session(request.session_id)
+
+        # 클라이언트 시각은 마지막 프레임 = 수신 시각이 되도록 서버 시각으로 옮김
+        now = time.time()
+        if request.timestamps:
+            offset = now - request.timestamps[-1]
+
+        results = []
+        for i, frame in enumerate(request.frames):
+            try:
+                landmarks = _landmarks_from_array(frame)
+            except ValueError as e:
+                results.append({"success": False, "message": str(e)})
+                continue
+
+            t = request.timestamps[i] + offset if request.timestamps else now
+            content = analyze_landmarks(session, exercise_code, detector_key, landmarks, t)
+            del content["landmarks"]
+            if request.delta:
+                content = session.delta.encode(content, request.keyframe and i == 0)
+            results.append(content)
+
         return JSONResponse(content={
             "success": True,
-            "landmarks": landmarks,
-            "analysis": analysis,
-            "rep": rep_info
+            "results": results
         })
-        
+
+    except Exception as e:
+        print(f"❌ 오류 발생: {str(e)}")
+        return JSONResponse(content={
+            "success": False,
+            "message": str(e)
+        }, status_code=500)
+    finally:
+        SERVER_LOAD.observe(time.perf_counter() - t0)
+
+# ================== 다인원 분석 ==================
+GROUP_MAX_PEOPLE = 8            # 한 프레임에서 분석할 최대 인원
+GROUP_DETECT_WIDTH = 640        # 사람 검출용 축소 폭
+GROUP_BOX_MARGIN = 0.15         # 검출 박스를 이만큼 넓혀서 팔다리가 잘리지 않게 함
+GROUP_POSE_WORKERS = max(1, min(4, os.cpu_count() or 1))
+GROUP_FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+
+# OpenCV 기본 HOG 검출기는 서 있는 사람만 찾음 - 엎드린 자세(푸시업/플랭크/마운틴 클라이머)는 지원하지 않음
+GROUP_SUPPORTED_DETECTORS = {"standing", "squat", "lunge", "chair_dip"}
+
+class PersonTracker:
+    """
+    IoU 기반 다인원 추적기 - 프레임 간 같은 사람에게 같은 person_id 부여
+    - 박스는 정규화 좌표 (x, y, w, h)
+    - max_missed 프레임 연속으로 안 보이면 id 폐기
+    """
+    def __init__(self, iou_thr: float = 0.3, max_missed: int = 10):
+        self.iou_thr = iou_thr
+        self.max_missed = max_missed
+        self.tracks = {}     # person_id → {"box": (x, y, w, h), "missed": 0}
+        self.next_id = 1
+
+    @staticmethod
+    def _iou(a, b):
+        ax2, ay2 = a[0] + a[2], a[1] + a[3]
+        bx2, by2 = b[0] + b[2], b[1] + b[3]
+        iw = max(0.0, min(ax2, bx2) - max(a[0], b[0]))
+        ih = max(0.0, min(ay2, by2) - max(a[1], b[1]))
+        inter = iw * ih
+        union = a[2] * a[3] + b[2] * b[3] - inter
+        return inter / union if union > 0 else 0.0
+
+    def update(self, boxes: list):
+        """이번 프레임 검출 박스들에 id를 매겨 [(person_id, box)] 반환"""
+        pairs = sorted(
+            ((self._iou(track["box"], box), pid, bi)
+             for pid, track in self.tracks.items()
+             for bi, box in enumerate(boxes)),
+            reverse=True
+        )
+
+        assigned = {}   # 박스 인덱스 → person_id
+        used = set()
+        for iou, pid, bi in pairs:
+            if iou < self.iou_thr:
+                break
+            if pid in used or bi in assigned:
+                continue
+            assigned[bi] = pid
+            used.add(pid)
+
+        for pid in list(self.tracks):
+            if pid not in used:
+                self.tracks[pid]["missed"] += 1
+                if self.tracks[pid]["missed"] > self.max_missed:
+                    del self.tracks[pid]
+
+        result = []
+        for bi, box in enumerate(boxes):
+            pid = assigned.get(bi)
+            if pid is None:
+                pid = self.next_id
+                self.next_id += 1
+            self.tracks[pid] = {"box": box, "missed": 0}
+            result.append((pid, box))
+        return result
+
+_group_executor = None
+_group_local = threading.local()
+
+def detect_people(image_rgb, max_people: int = GROUP_MAX_PEOPLE):
+    """
+    HOG 사람 검출기로 인물 영역 검출 - 정규화 박스 (x, y, w, h) 리스트, 큰 순서
+    - 640px 기준 프레임당 약 150ms라 워커 스레드에서 실행 (검출기는 스레드마다 하나)
+    """
+    hog = getattr(_group_local, "hog", None)
+    if hog is None:
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        _group_local.hog = hog
+
+    h, w = image_rgb.shape[:2]
+    scale = min(1.0, GROUP_DETECT_WIDTH / w)
+    small = cv2.resize(image_rgb, (int(w * scale), int(h * scale))) if scale < 1.0 else image_rgb
+    rects, weights = hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+    if len(rects) == 0:
+        return []
+
+    keep = cv2.dnn.NMSBoxes([list(map(int, r)) for r in rects],
+                            [float(wt) for wt in np.ravel(weights)], 0.3, 0.45)
+    sh, sw = small.shape[:2]
+    boxes = []
+    for i in np.ravel(keep):
+        x, y, bw, bh = rects[i]
+        mx, my = bw * GROUP_BOX_MARGIN, bh * GROUP_BOX_MARGIN
+        x0, y0 = max(0.0, (x - mx) / sw), max(0.0, (y - my) / sh)
+        x1, y1 = min(1.0, (x + bw + mx) / sw), min(1.0, (y + bh + my) / sh)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    boxes.sort(key=lambda b: b[2] * b[3], reverse=True)
+    return boxes[:max_people]
+
+def _estimate_pose_in_box(image_rgb, box):
+    """
+    워커 스레드에서 실행 - 박스 영역만 잘라 포즈 추정 후 전체 프레임 정규화 좌표로 변환
+    - 스레드마다 별도 MediaPipe 인스턴스 사용 (인스턴스는 스레드 안전하지 않음)
+    - 박스가 사람마다 바뀌므로 추적 모드가 아닌 static_image_mode로 실행
+    """
+    detector = getattr(_group_local, "pose", None)
+    if detector is None:
+        detector = mp_pose.Pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
+        _group_local.pose = detector
+
+    h, w = image_rgb.shape[:2]
+    x0, y0 = int(box[0] * w), int(box[1] * h)
+    x1, y1 = int((box[0] + box[2]) * w), int((box[1] + box[3]) * h)
+    crop = np.ascontiguousarray(image_rgb[y0:y1, x0:x1])
+    if crop.size == 0:
+        return None
+    crop.flags.writeable = False
+
+    results = detector.process(crop)
+    if not results.pose_landmarks:
+        return None
+
+    cw, ch = x1 - x0, y1 - y0
+    return [{
+        "x": (x0 + lm.x * cw) / w,
+        "y": (y0 + lm.y * ch) / h,
+        "z": lm.z * cw / w,
+        "visibility": lm.visibility
+    } for lm in results.pose_landmarks.landmark]
+
+def _get_group_executor():
+    global _group_executor
+    if _group_executor is None:
+        _group_executor = ThreadPoolExecutor(max_workers=GROUP_POSE_WORKERS, thread_name_prefix="group-pose")
+    return _group_executor
+
+@app.post("/api/analyze-group")
+@profiled
+async def analyze_group(request: GroupAnalysisRequest):
+    """
+    카메라 한 대로 여러 명 분석
+    - 인물 영역 검출 → 사람별 포즈 추정을 워커 스레드에서 병렬 실행
+      ▷ 검출/추정을 기다리는 동안 이벤트 루프를 막지 않음 (다른 세션의 요청은 계속 처리)
+    - 추적기로 프레임 간 같은 사람에게 같은 person_id를 부여하고,
+      사람마다 별도 세션("<session_id>#<person_id>")으로 점수/반복 수/오류 알림 관리
+    - 서 있는 자세 운동만 지원 (스쿼트, 런지, 체어 딥스, 기본 자세 - GROUP_SUPPORTED_DETECTORS)
+    - 사람이 검출되지 않으면
+      ▷ 추적 중인 사람이 없으면(또는 전체 프레임으로 추적 중이면) 전체 프레임을 한 사람으로 보고 분석
+      ▷ 추적 중인 사람이 있으면 검출 누락으로 보고 그 프레임은 건너뜀 (새 person_id가 생겨 기록이 갈라지지 않게)
+    """
+    t0 = time.perf_counter()
+    try:
+        exercise_code = EXERCISE_CODE_MAPPING.get(request.exercise_code, request.exercise_code.lower())
+        detector_key = EXERCISE_DETECTOR_MAPPING.get(request.exercise_code, exercise_code)
+        if detector_key not in GROUP_SUPPORTED_DETECTORS:
+            return JSONResponse(content={
+                "success": False,
+                "message": "다인원 분석은 서 있는 자세 운동만 지원합니다 (한 명은 /api/analyze-pose 사용)"
+            }, status_code=400)
+
+        session = get_session(request.session_id)
+        if session.tracker is None:
+            session.tracker = PersonTracker()
+
+        image_rgb = decode_frame_rgb(request.image, session)
+
+        executor = _get_group_executor()
+        run = _active_profile
+
+        def submit(fn, *args):
+            if run is None:
+                return asyncio.wrap_future(executor.submit(fn, *args))
+            return asyncio.wrap_future(executor.submit(run.profile_call, fn, *args))
+
+        boxes = await submit(detect_people, image_rgb, min(request.max_people, GROUP_MAX_PEOPLE))
+        if not boxes:
+            if any(track["box"] != GROUP_FULL_FRAME for track in session.tracker.tracks.values()):
+                session.tracker.update([])   # 놓친 프레임 수만 증가
+                return JSONResponse(content={"success": False, "message": "No person detected"})
+            boxes = [GROUP_FULL_FRAME]
+        previous_ids = set(session.tracker.tracks)
+        tracked = session.tracker.update(boxes)
+
+        estimates = await asyncio.gather(*(submit(_estimate_pose_in_box, image_rgb, box) for _, box in tracked))
+
+        t = time.time()
+        people = []
+        for (person_id, box), landmarks in zip(tracked, estimates):
+            person_session = get_session(f"{request.session_id}#{person_id}")
+            if landmarks is None:
+                update_rep_without_pose(person_session, detector_key, t, clear_alerts=True)
+                continue
+            content = analyze_landmarks(person_session, exercise_code, detector_key, landmarks, t)
+            content["person_id"] = person_id
+            content["box"] = [round(v, 4) for v in box]
+            people.append(content)
+
+        # 이번 프레임에 안 보인 사람은 기기 알림 상태 해제 (세션이 없으면 새로 만들지 않음)
+        for person_id in previous_ids - {pid for pid, _ in tracked}:
+            person_session = SESSIONS.get(f"{request.session_id}#{person_id}")
+            if person_session is not None:
+                update_alerts(person_session, None, t)
+
+        if not people:
+            return JSONResponse(content={"success": False, "message": "No pose detected"})
+
+        # 카메라는 하나라서 가장 촘촘한 샘플링이 필요한 사람 기준
+        return JSONResponse(content={
+            "success": True,
+            "people": people,
+            "next_interval_ms": min(p["next_interval_ms"] for p in people)
+        })
+
     except Exception as e:
         print(f"❌ 오류 발생: {str(e)}")
         return JSONResponse(content={
             "success": False,
             "message": str(e)
         }, status_code=500)
+    finally:
+        SERVER_LOAD.observe(time.perf_counter() - t0)
+
+# ================== 세션 스냅샷 ==================
+# 스냅샷은 pickle이라 파일을 쓸 수 있는 사람은 서버에서 코드를 실행할 수 있음
+# → 기본은 비활성화, FITAI_SNAPSHOT_PATH로 서버 계정만 쓸 수 있는 디렉터리(예: 0700)의 경로를 지정했을 때만 사용
+SNAPSHOT_PATH = os.environ.get("FITAI_SNAPSHOT_PATH") or None
+SNAPSHOT_INTERVAL = float(os.environ.get("FITAI_SNAPSHOT_INTERVAL", "5.0"))   # 주기적 저장 간격 (초)
+SNAPSHOT_VERSION = 2   # 스냅샷 형식 자체가 바뀔 때 올림 (세션 객체 구성 변화는 SNAPSHOT_LAYOUT이 자동 감지)
+
+def _snapshot_layout():
+    """
+    세션 객체 구성 지문 - 클래스별 속성 이름 목록
+    - pickle은 객체의 속성을 그대로 저장하므로 속성이 추가/삭제된 코드에서 이전 스냅샷을 복원하면
+      요청마다 AttributeError가 나고 last_seen이 갱신되어 정리되지도 않음 → 지문이 다르면 스냅샷 전체를 무시
+    - 검출기/추적기는 처음 쓸 때 만들어지므로 모두 채운 예시 세션으로 계산
+    """
+    sample = SessionState("_layout")
+    sample.tracker = PersonTracker()
+    for key in EXERCISE_DETECTOR_PARAMS:
+        sample.get_detector(key)
+
+    layout = {}
+    def walk(obj):
+        if isinstance(obj, dict):
+            for value in obj.values():
+                walk(value)
+        elif isinstance(obj, (list, tuple)):
+            for value in obj:
+                walk(value)
+        elif type(obj).__module__ == __name__ and hasattr(obj, "__dict__"):
+            name = type(obj).__qualname__
+            if name not in layout:
+                layout[name] = sorted(vars(obj))
+                walk(vars(obj))
+    walk(sample)
+    return layout
+
+SNAPSHOT_LAYOUT = _snapshot_layout()
+
+class SessionSnapshotter:
+    """
+    전체 세션 상태(반복/유지 검출기, 오류 지속 타이머, 기기 발행 상태, 델타 응답 상태 등)를 로컬 파일로 저장/복원
+    - 직렬화(pickle)는 이벤트 루프에서 해서 요청 처리 중간 상태가 섞이지 않고, 파일 쓰기만 스레드로 넘김
+    - 세션별로 따로 직렬화해서 last_seen과 함께 캐시 → 마지막 저장 이후 요청이 온 세션만 다시 직렬화
+    - 마지막 저장 이후 세션 변화가 전혀 없으면 저장 자체를 건너뜀
+    - 같은 디렉터리에 mkstemp로 만든 0600 임시 파일에 쓴 뒤 os.replace로 교체
+      ▷ 저장 도중 프로세스가 죽어도 이전 스냅샷은 그대로 남고, 예측 가능한 임시 파일 이름(심볼릭 링크 덮어쓰기)이 없음
+    - 복원 전에 파일이 현재 프로세스 계정 소유의 일반 파일이고 group/other 쓰기 권한이 없는지 확인
+    - acquire(): 스냅샷 파일 하나는 프로세스 하나만 사용 (uvicorn --workers처럼 여러 프로세스가 같은 경로를 받으면
+      처음 잠근 프로세스만 저장/복원하고 나머지는 스냅샷 없이 동작)
+    - 시각은 모두 time.time() 기준이라 재시작 후에도 지속시간/쿨다운/유지 시간이 그대로 이어짐
+    - SNAPSHOT_VERSION과 SNAPSHOT_LAYOUT이 현재 코드와 다른 스냅샷은 복원하지 않음 (배포 후 세션 객체 구성이 바뀐 경우)
+    - 파일/잠금 문제(디렉터리 없음, 권한 없음 등)는 로그만 남기고 스냅샷 없이 계속 동작
+    """
+    def __init__(self, path: str, interval: float = SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.saved_version = None
+        self._blobs = {}   # session_id → (last_seen, 직렬화된 세션)
+        self.saves = 0
+        self.last_dumped = 0
+        self.last_bytes = 0
+        self.last_dump_ms = 0.0
+        self.last_write_ms = 0.0
+        self.restored = 0
+        self.restore_ms = 0.0
+        self._stop = None
+        self._task = None
+        self._lock_fd = None
+
+    def acquire(self):
+        """<path>.lock에 배타적 잠금 - 다른 프로세스가 이미 쓰고 있거나 잠금 파일을 열 수 없으면 False"""
+        if fcntl is None:
+            return True
+        try:
+            fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        except OSError as e:
+            print(f"⚠️ 세션 스냅샷 잠금 파일을 열 수 없습니다: {e}")
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            print(f"⚠️ 다른 프로세스가 세션 스냅샷({self.path})을 사용 중입니다")
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def dump(self):
+        """현재 세션 전체를 bytes로 직렬화 (바뀐 세션만 새로 직렬화)"""
+        t0 = time.perf_counter()
+        blobs = {}
+        dumped = 0
+        for sid, session in SESSIONS.items():
+            cached = self._blobs.get(sid)
+            if cached is None or cached[0] != session.last_seen:
+                cached = (session.last_seen, pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+                dumped += 1
+            blobs[sid] = cached
+        self._blobs = blobs   # 정리된 세션은 여기서 빠짐
+
+        data = pickle.dumps({
+            "version": SNAPSHOT_VERSION,
+            "layout": SNAPSHOT_LAYOUT,
+            "saved_at": time.time(),
+            "sessions": {sid: blob for sid, (_, blob) in blobs.items()},
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        self.last_dumped = dumped
+        self.last_dump_ms = (time.perf_counter() - t0) * 1000.0
+        return data
+
+    def write(self, data: bytes):
+        t0 = time.perf_counter()
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)   # O_EXCL, 0600
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.last_write_ms = (time.perf_counter() - t0) * 1000.0
+        self.last_bytes = len(data)
+        self.saves += 1
+
+    def save(self):
+        """동기 저장 (종료 시/벤치마크용)"""
+        version = _sessions_version
+        self.write(self.dump())
+        self.saved_version = version
+
+    def restore(self):
+        """스냅샷 파일에서 세션 복원 - 복원한 세션 수 반환 (파일이 없거나 읽을 수 없으면 0)"""
+        t0 = time.perf_counter()
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"⚠️ 세션 스냅샷을 열 수 없어 무시합니다: {e}")
+            return 0
+
+        with os.fdopen(fd, "rb") as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                print(f"⚠️ 세션 스냅샷이 일반 파일이 아니라 무시합니다: {self.path}")
+                return 0
+            if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+                print(f"⚠️ 세션 스냅샷 소유자/권한이 안전하지 않아 무시합니다 (uid={st.st_uid}, mode={oct(st.st_mode & 0o777)}): {self.path}")
+                return 0
+            try:
+                state = pickle.load(f)
+            except Exception as e:
+                print(f"⚠️ 세션 스냅샷을 읽을 수 없어 무시합니다: {e}")
+                return 0
+
+        if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+            print("⚠️ 세션 스냅샷 버전이 달라 무시합니다")
+            return 0
+        if state.get("layout") != SNAPSHOT_LAYOUT:
+            print("⚠️ 세션 스냅샷의 세션 객체 구성이 현재 코드와 달라 무시합니다")
+            return 0
+
+        now = time.time()
+        restored = 0
+        # 작은 객체를 한꺼번에 많이 만드는 동안 GC가 반복 실행되지 않게 잠시 끔
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for sid, blob in state["sessions"].items():
+                try:
+                    session = pickle.loads(blob)
+                except Exception as e:
+                    print(f"⚠️ 세션 {sid} 복원 실패: {e}")
+                    continue
+                if now - session.last_seen > SESSION_IDLE_TIMEOUT:
+                    continue
+                SESSIONS[sid] = session
+                self._blobs[sid] = (session.last_seen, blob)
+                restored += 1
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        self.restored = restored
+        self.restore_ms = (time.perf_counter() - t0) * 1000.0
+        self.saved_version = _sessions_version
+        print(f"♻️ 세션 {self.restored}개 복원 ({self.restore_ms:.1f}ms, 저장 후 {now - state['saved_at']:.1f}초 경과)")
+        return self.restored
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            version = _sessions_version
+            if version == self.saved_version:
+                continue
+            try:
+                await asyncio.to_thread(self.write, self.dump())
+                self.saved_version = version
+            except Exception as e:
+                print(f"❌ 세션 스냅샷 저장 실패: {e}")
+
+    def start(self):
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """주기 저장 중단 - 진행 중인 쓰기가 끝날 때까지 기다림"""
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "saves": self.saves,
+            "bytes": self.last_bytes,
+            "dumped": self.last_dumped,
+            "dump_ms": round(self.last_dump_ms, 2),
+            "write_ms": round(self.last_write_ms, 2),
+            "restored": self.restored,
+            "restore_ms": round(self.restore_ms, 2),
+        }
+
+_snapshotter = SessionSnapshotter(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+
+async def restore_sessions():
+    """lifespan 시작 - 스냅샷 파일을 잠근 프로세스만 복원 후 주기 저장 시작"""
+    global _snapshotter
+    if _snapshotter is None:
+        return
+    if not _snapshotter.acquire():
+        print("⚠️ 이 프로세스는 세션 스냅샷 없이 동작합니다")
+        _snapshotter = None
+        return
+    _snapshotter.restore()
+    _snapshotter.start()
+
+async def save_sessions():
+    """lifespan 종료 - uvicorn이 진행 중인 요청을 모두 처리한 뒤 호출, 마지막 상태를 저장"""
+    if _snapshotter is not None:
+        await _snapshotter.stop()
+        try:
+            _snapshotter.save()
+            print(f"💾 세션 {len(SESSIONS)}개 저장 ({_snapshotter.last_bytes / 1e3:.1f}KB)")
+        except Exception as e:
+            print(f"❌ 세션 스냅샷 저장 실패: {e}")
+        _snapshotter.release()
+
+# ================== prefork 워커 초기화 ==================
+def init_worker_process(worker_index: int = None):
+    """
+    prefork 모드(app/prefork.py)에서 fork된 자식 프로세스 초기화
+    - 부모에서 읽어 둔 모듈/정적 테이블은 copy-on-write로 그대로 공유
+    - 스레드나 네트워크 연결을 가진 객체(Pose 그래프, boto3 클라이언트, 스레드 풀)만 새로 생성
+      ▷ Pose 모델은 여기서 워커마다 로드 (부모는 모델 파일을 페이지 캐시에만 올려 둠)
+      ▷ Pose()는 그래프만 만들고 모델은 첫 process()에서 올라가므로 빈 프레임 하나로 미리 실행
+        → 준비 완료 보고/메모리 측정에 모델 메모리가 포함되고, 첫 사용자 요청이 모델 로딩을 떠안지 않음
+    - SESSIONS는 워커마다 따로 있음 - 여러 워커로 띄우면 앞단에서 session_id 기준 sticky session 필요
+    - 워커마다 세션이 따로 있으므로 스냅샷 파일도 워커 번호별로 나눔 (재시작한 워커는 같은 번호의 파일을 복원)
+    """
+    global iot_client, _group_executor, _snapshotter
+    iot_client = boto3.client('iot-data', region_name='ap-northeast-2')
+    _group_executor = None
+    SESSIONS.clear()
+    if SNAPSHOT_PATH and worker_index is not None:
+        _snapshotter = SessionSnapshotter(f"{SNAPSHOT_PATH}.{worker_index}")
+    get_pose().process(np.zeros((256, 256, 3), np.uint8))
 
 # ============= IoT API 엔드포인트 추가 =============
 @app.post("/api/left-arm-alert")
@@ -954,16 +2350,33 @@ async def api_right_arm_alert():
 async def root():
     return {"message": "FITAI Backend API with IoT", "version": "11.0 - Complete 4-Part System + Enhanced Reps Filter + Duration-based IoT"}
 
+def session_counter_totals():
+    """
+    /health용 검출기별 집계 (세션 수, 반복/유지 횟수 합)
+    - session_id를 알면 그 사용자의 운동에 프레임을 보낼 수 있으므로 세션별 값/ID는 노출하지 않음
+    """
+    totals = {}
+    for session in SESSIONS.values():
+        for key, detector in session.detectors.items():
+            if detector is None:
+                continue
+            info = detector.as_dict()
+            agg = totals.setdefault(key, {"sessions": 0, "total": 0, "correct": 0, "wrong": 0})
+            agg["sessions"] += 1
+            agg["total"] += info["total"]
+            agg["correct"] += info["correct"]
+            agg["wrong"] += info["wrong"]
+    return totals
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "iot_enabled": True,
         "devices": ["left_arm", "right_arm", "left_leg", "right_leg"],
-        "counters": {
-            "squat": SQUAT_COUNTER.as_dict(),
-            "lunge": LUNGE_COUNTER.as_dict(),
-        }
+        "sessions": len(SESSIONS),
+        "counters": session_counter_totals(),
+        "snapshot": _snapshotter.as_dict() if _snapshotter is not None else None
     }
 
 if __name__ == "__main__":
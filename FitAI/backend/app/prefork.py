@@ -0,0 +1,252 @@
+"""
+preload-then-fork 서버 실행 (Linux 전용)
+
+uvicorn --workers는 워커마다 앱을 새로 import해서 MediaPipe/NumPy/OpenCV와 운동 테이블을
+각자 메모리에 올린다. 이 모드는 부모 프로세스에서 한 번만 import한 뒤 fork해서
+모듈/정적 테이블을 자식들이 copy-on-write로 공유하게 한다.
+
+공유되는 것과 아닌 것:
+- 부모는 Pose 모델 파일(.tflite/.binarypb)을 읽어서 페이지 캐시에 올려 두기만 한다 (warm_model_assets).
+  Pose 모델(그래프/TFLite 인터프리터)은 각 워커가 init_worker_process에서 따로 로드하므로
+  그 메모리는 공유되지 않고 워커 수만큼 든다. IoT 클라이언트도 워커마다 만든다.
+
+⚠️ 워커가 2개 이상이면 sticky session이 필요하다:
+- 세션 상태(SESSIONS - 반복 카운터, 델타 인코더, 캘리브레이션, 알림 타이머)는 워커 프로세스마다 따로 있고,
+  커널은 연결을 아무 워커에나 나눠 주며 워커끼리 세션을 공유하거나 요청을 넘기지 않는다.
+- 한 session_id의 요청이 여러 워커로 흩어지면 반복 수가 워커별로 따로 세어지고,
+  델타 응답의 seq/기준 상태도 워커마다 달라 클라이언트가 받는 diff가 뒤섞인다.
+- 같은 session_id는 항상 같은 워커로 가도록 앞단 프록시에서 고정하거나(예: session_id 해시 기반 라우팅,
+  워커마다 포트를 따로 열어 프록시가 고르게 하는 구성), 세션 상태가 필요 없는 배포에서만 여러 워커를 쓴다.
+
+시작이 끝나면 부모 로딩 시간, 워커별 초기화 시간과 메모리(RSS / PSS / 워커 고유 USS)를 출력한다.
+USS가 워커 하나를 더 띄울 때 실제로 늘어나는 메모리다.
+워커마다 세션이 따로 있으므로 세션 스냅샷은 워커 번호별 파일(<FITAI_SNAPSHOT_PATH>.<번호>)에 저장/복원한다.
+
+사용법 (backend 디렉터리에서):
+    python -m app.prefork --workers 4 --port 8000
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+_t_start = time.perf_counter()
+
+RESPAWN_FAST_FAIL_SEC = 10.0   # 시작 후 이 시간 안에 죽으면 "바로 실패"로 봄
+RESPAWN_MAX_FAST_FAILS = 5     # 같은 번호의 워커가 연속으로 이만큼 바로 실패하면 재시작 포기
+RESPAWN_BACKOFF_MAX_SEC = 30.0
+
+
+def read_memory(pid: int):
+    """/proc/<pid>/smaps_rollup에서 RSS/PSS/USS(MB) 읽기"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+    }
+
+
+def warm_model_assets(mp_module):
+    """MediaPipe 모델 파일을 미리 읽어 페이지 캐시에 올림 (자식들이 그래프 생성 시 디스크를 다시 읽지 않음)"""
+    root = os.path.dirname(mp_module.__file__)
+    total = 0
+    for path in glob.glob(os.path.join(root, "modules", "pose_*", "*.tflite")) + \
+            glob.glob(os.path.join(root, "modules", "pose_*", "*.binarypb")):
+        with open(path, "rb") as f:
+            total += len(f.read())
+    return total
+
+
+def run_worker(sock, args, ready_fd, index):
+    """fork된 자식 - 프로세스별 상태만 초기화하고 부모가 연 소켓으로 서비스"""
+    import uvicorn
+    from app import main
+
+    t0 = time.perf_counter()
+    main.init_worker_process(index)
+    init_sec = time.perf_counter() - t0
+
+    os.write(ready_fd, (json.dumps({"pid": os.getpid(), "index": index, "init_sec": round(init_sec, 3)}) + "\n").encode())
+    os.close(ready_fd)
+
+    config = uvicorn.Config(main.app, log_level=args.log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def spawn(sock, args, index):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            run_worker(sock, args, write_fd, index)
+        except BaseException:
+            # os._exit는 예외를 출력하지 않으므로 원인을 직접 남김
+            traceback.print_exc()
+            sys.stderr.flush()
+        finally:
+            os._exit(1)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def read_ready(read_fd):
+    with os.fdopen(read_fd, "rb") as f:
+        line = f.readline()
+    return json.loads(line) if line else None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="모델/정적 데이터를 미리 로드한 뒤 fork하는 FitAI 서버")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--report-json", default=None, help="기동 리포트를 저장할 파일")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("❌ prefork 모드는 fork를 지원하는 OS(Linux)에서만 사용할 수 있습니다")
+
+    if args.workers > 1:
+        print(f"⚠️ 워커 {args.workers}개 - 세션 상태는 워커마다 따로 있습니다. "
+              "같은 session_id가 같은 워커로 가도록 sticky session을 설정하세요")
+
+    # 1) 부모: 무거운 모듈 import + 정적 테이블 + 모델 파일을 페이지 캐시에 미리 로드 (Pose 모델은 워커마다 로드)
+    parent_before = read_memory(os.getpid())
+    t0 = time.perf_counter()
+    import mediapipe
+    from app import main  # noqa: F401  (numpy/cv2/mediapipe, EXERCISE_* 테이블 로드)
+    model_bytes = warm_model_assets(mediapipe)
+    preload_sec = time.perf_counter() - t0
+
+    # 이후 GC가 공유 객체 헤더를 건드려 페이지가 복사되지 않도록 현재 객체를 영구 세대로 이동
+    gc.collect()
+    gc.freeze()
+    parent_after = read_memory(os.getpid())
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # 2) 자식 fork
+    t_fork = time.perf_counter()
+    children = {}   # pid → 워커 번호 (세션 스냅샷 파일 구분용, 재시작해도 같은 번호)
+    started_at = {}  # 워커 번호 → 마지막 fork 시각
+    fast_fails = {}  # 워커 번호 → 연속으로 바로 실패한 횟수
+    gave_up = False
+    pipes = []
+    ready = []
+    for index in range(args.workers):
+        pid, read_fd = spawn(sock, args, index)
+        children[pid] = index
+        started_at[index] = time.monotonic()
+        pipes.append(read_fd)
+    for read_fd in pipes:
+        info = read_ready(read_fd)
+        if info:
+            ready.append(info)
+    all_ready_sec = time.perf_counter() - t_fork
+
+    # 3) 리포트
+    workers = []
+    for info in ready:
+        mem = read_memory(info["pid"]) or {}
+        workers.append({**info, **mem})
+    report = {
+        "workers": args.workers,
+        "preload_sec": round(preload_sec, 3),
+        "model_bytes_warmed": model_bytes,
+        "all_workers_ready_sec": round(all_ready_sec, 3),
+        "total_startup_sec": round(time.perf_counter() - _t_start, 3),
+        "parent_before": parent_before,
+        "parent_after_preload": parent_after,
+        "worker_memory": workers,
+        "uss_per_worker_mb": round(sum(w.get("uss_mb", 0) for w in workers) / max(1, len(workers)), 1),
+        "total_pss_mb": round(sum(w.get("pss_mb", 0) for w in workers) + (read_memory(os.getpid()) or {}).get("pss_mb", 0), 1),
+    }
+
+    print(f"🚀 prefork 서버 {args.host}:{args.port} - 워커 {len(ready)}/{args.workers}개 준비")
+    print(f"   부모 로딩 {report['preload_sec']}초, 전체 워커 준비 {report['all_workers_ready_sec']}초")
+    print(f"   {'pid':>8} {'init s':>7} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+    for w in workers:
+        print(f"   {w['pid']:>8} {w['init_sec']:>7} {w.get('rss_mb', '-'):>8} {w.get('pss_mb', '-'):>8} {w.get('uss_mb', '-'):>8}")
+    print(f"   워커당 추가 메모리(USS 평균) {report['uss_per_worker_mb']}MB, 전체 PSS {report['total_pss_mb']}MB")
+
+    if args.report_json:
+        with open(args.report_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 4) 종료 신호를 자식에게 전달하고 회수
+    stopping = False
+
+    def handle_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if stopping or index is None:
+            continue
+
+        # 예기치 않게 죽은 워커는 같은 번호로 다시 fork (부모의 공유 메모리를 그대로 재사용, 세션 스냅샷 복원)
+        # 시작하자마자 죽는 경우(의존성 누락 등)는 점점 길게 기다렸다가 재시작하고, 계속 실패하면 포기
+        if time.monotonic() - started_at[index] < RESPAWN_FAST_FAIL_SEC:
+            fast_fails[index] = fast_fails.get(index, 0) + 1
+        else:
+            fast_fails[index] = 0
+        if fast_fails[index] >= RESPAWN_MAX_FAST_FAILS:
+            print(f"❌ 워커 {index}번이 시작 직후 {fast_fails[index]}회 연속 종료(status={status}) - 재시작을 포기합니다 (위 traceback 확인)")
+            gave_up = True
+            continue
+        delay = min(RESPAWN_BACKOFF_MAX_SEC, 2 ** fast_fails[index] - 1) if fast_fails[index] else 0
+        print(f"⚠️ 워커 {pid} 종료(status={status}) - {delay}초 후 재시작")
+        if delay:
+            time.sleep(delay)
+        if stopping:
+            continue
+        new_pid, read_fd = spawn(sock, args, index)
+        started_at[index] = time.monotonic()
+        read_ready(read_fd)
+        children[new_pid] = index
+
+    sock.close()
+    sys.exit(1 if gave_up else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,107 @@
+"""
+프레임 수신(디코딩) 경로 벤치마크
+
+이전 방식(base64 split → imdecode BGR → cvtColor로 RGB 복사)과
+decode_frame_rgb(RGB 직접 디코딩/제자리 변환, 세션 해상도별 축소 디코딩)를 비교한다.
+decode_frame_rgb를 전체 해상도로 고정한 행도 함께 출력해서, 복사를 줄인 효과와
+축소 디코딩(해상도 감소) 효과를 따로 볼 수 있게 한다.
+tracemalloc으로 프레임 하나를 디코딩하는 동안 동시에 할당된 버퍼 크기를 측정하고,
+--with-pose를 주면 MediaPipe 추론까지 포함한 시간을 잰다.
+
+사용법 (backend 디렉터리에서):
+    python -m tools.bench_ingest --width 1280 --frames 100
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app import main
+from tools.loadtest import DEFAULT_VIDEO, load_video_frames
+
+
+def legacy_decode(image: str, session):
+    """기존 analyze_pose의 디코딩 경로"""
+    image_data = base64.b64decode(image.split(',')[1] if ',' in image else image)
+    nparr = np.frombuffer(image_data, np.uint8)
+    bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def full_res_decode(image: str, session):
+    """decode_frame_rgb를 축소 디코딩 없이 전체 해상도로 고정 - legacy와 같은 해상도에서 복사 절감만 비교"""
+    session.decode_flags = main._DECODE_FULL
+    return main.decode_frame_rgb(image, session)
+
+
+def bench(name, decode, frames, repeat, with_pose):
+    session = main.SessionState(f"bench-{name}")
+    pose = main.mp_pose.Pose(static_image_mode=False, model_complexity=1) if with_pose else None
+
+    # 워밍업 (세션 해상도 결정 포함)
+    for frame in frames[:5]:
+        decode(frame, session)
+
+    # 시간 측정 (tracemalloc 끈 상태)
+    t0 = time.perf_counter()
+    shape = None
+    for _ in range(repeat):
+        for frame in frames:
+            image = decode(frame, session)
+            shape = image.shape
+            if pose is not None:
+                pose.process(image)
+    elapsed = time.perf_counter() - t0
+
+    # 메모리 측정 - 프레임 하나 디코딩하는 동안 동시에 살아 있던 버퍼 크기(peak - 시작 시점)
+    tracemalloc.start()
+    frame_peaks = []
+    for frame in frames:
+        image = None
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        image = decode(frame, session)
+        _, peak = tracemalloc.get_traced_memory()
+        frame_peaks.append(peak - base)
+    tracemalloc.stop()
+
+    if pose is not None:
+        pose.close()
+
+    return {
+        "name": name,
+        "shape": shape,
+        "ms_per_frame": round(elapsed / (repeat * len(frames)) * 1000.0, 3),
+        "frame_peak_kb": round(float(np.mean(frame_peaks)) / 1e3, 1),
+        "output_kb": round(image.nbytes / 1e3, 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="프레임 디코딩 경로 벤치마크")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--width", type=int, default=1280, help="프레임 가로 크기 (프론트엔드 카메라 ideal 1280)")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--with-pose", action="store_true", help="MediaPipe 추론 시간 포함")
+    args = parser.parse_args()
+
+    frames = load_video_frames(args.video, args.frames, args.width, args.quality)
+    print(f"🎬 {len(frames)}개 프레임, 가로 {args.width}px")
+
+    rows = [
+        bench("legacy", legacy_decode, frames, args.repeat, args.with_pose),
+        bench("decode_rgb_full", full_res_decode, frames, args.repeat, args.with_pose),
+        bench("decode_frame_rgb", main.decode_frame_rgb, frames, args.repeat, args.with_pose),
+    ]
+    print(f"{'path':<18} {'shape':<16} {'ms/frame':>9} {'frame peak KB':>14} {'output KB':>10}")
+    for r in rows:
+        print(f"{r['name']:<18} {str(r['shape']):<16} {r['ms_per_frame']:>9} {r['frame_peak_kb']:>14} {r['output_kb']:>10}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,109 @@
+"""
+세션 스냅샷 저장/복원 비용 벤치마크
+
+녹화 영상에서 뽑은 랜드마크로 세션 N개를 실제 운동 중인 상태(검출기 링 버퍼, 오류 타이머,
+캘리브레이션, 델타 상태)로 만든 뒤, 세션 수별로 SessionSnapshotter의
+직렬화 시간(이벤트 루프를 막는 시간), 파일 쓰기 시간, 파일 크기, 복원 시간을 잰다.
+직렬화는 처음 저장(전체 세션)과 --dirty 비율의 세션만 바뀐 뒤의 주기 저장을 따로 잰다.
+
+사용법 (backend 디렉터리에서):
+    python -m tools.bench_snapshot --sessions 10,100,1000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app import main
+from tools.loadtest import DEFAULT_VIDEO, FakeIoTClient, extract_landmark_frames, load_video_frames
+
+
+def populate(count: int, frames, frames_per_session: int, exercise_code: str):
+    """세션 count개를 만들고 각각 frames_per_session개 프레임을 분석해서 상태를 채움"""
+    main.SESSIONS.clear()
+    code = main.EXERCISE_CODE_MAPPING.get(exercise_code, exercise_code.lower())
+    detector_key = main.EXERCISE_DETECTOR_MAPPING.get(exercise_code, code)
+    t0 = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for idx in range(count):
+            session = main.get_session(f"bench-{idx}")
+            offset = idx * 7
+            for i in range(frames_per_session):
+                landmarks = main._landmarks_from_array(frames[(offset + i) % len(frames)])
+                content = main.analyze_landmarks(session, code, detector_key, landmarks, t0 + i * 0.2)
+                session.delta.encode(content)
+
+
+def bench(count: int, path: str, repeat: int, dirty: float):
+    dump_ms, incr_ms, write_ms, restore_ms = [], [], [], []
+    for _ in range(repeat):
+        snapshotter = main.SessionSnapshotter(path)
+        data = snapshotter.dump()
+        dump_ms.append(snapshotter.last_dump_ms)
+        snapshotter.write(data)
+        write_ms.append(snapshotter.last_write_ms)
+
+        # 일부 세션에만 요청이 온 뒤의 주기 저장
+        for session in list(main.SESSIONS.values())[:max(1, int(count * dirty))]:
+            session.last_seen += 0.2
+        snapshotter.dump()
+        incr_ms.append(snapshotter.last_dump_ms)
+
+    saved = dict(main.SESSIONS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            main.SESSIONS.clear()
+            snapshotter.restore()
+            restore_ms.append(snapshotter.restore_ms)
+    restored = snapshotter.restored
+    main.SESSIONS.clear()
+    main.SESSIONS.update(saved)
+
+    size = os.path.getsize(path)
+    return {
+        "sessions": count,
+        "restored": restored,
+        "bytes": size,
+        "bytes_per_session": round(size / max(1, count)),
+        "dump_ms": round(float(np.median(dump_ms)), 2),
+        "incr_dump_ms": round(float(np.median(incr_ms)), 2),
+        "write_ms": round(float(np.median(write_ms)), 2),
+        "restore_ms": round(float(np.median(restore_ms)), 2),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="세션 스냅샷 저장/복원 벤치마크")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--sessions", default="10,100,1000",
+                        type=lambda s: [int(x) for x in s.split(",")], help="세션 수 목록")
+    parser.add_argument("--frames-per-session", type=int, default=30)
+    parser.add_argument("--exercise-code", default="001")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dirty", type=float, default=0.1, help="주기 저장 사이에 바뀐 세션 비율")
+    args = parser.parse_args()
+
+    main.iot_client = FakeIoTClient()
+    frames = extract_landmark_frames(load_video_frames(args.video, 150, 640, 80))
+    print(f"🎬 랜드마크 {len(frames)}개 프레임 준비 완료")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.snapshot")
+        for count in args.sessions:
+            populate(count, frames, args.frames_per_session, args.exercise_code)
+            rows.append(bench(count, path, args.repeat, args.dirty))
+
+    dirty_col = f"dump {args.dirty:.0%}"
+    print(f"{'sessions':>8} {'KB':>9} {'B/sess':>7} {'dump ms':>8} {dirty_col + ' ms':>12} {'write ms':>9} {'restore ms':>11}")
+    for r in rows:
+        print(f"{r['sessions']:>8} {r['bytes'] / 1e3:>9.1f} {r['bytes_per_session']:>7} "
+              f"{r['dump_ms']:>8} {r['incr_dump_ms']:>12} {r['write_ms']:>9} {r['restore_ms']:>11}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,281 @@
+"""
+FitAI 백엔드 동시 세션 부하 테스트
+
+녹화된 운동 영상(frontend/public/*.mp4)에서 프레임을 뽑아 N개의 세션이
+프론트엔드와 같은 방식(고정 간격 전송, 이전 요청이 끝나지 않았으면 그 프레임은 건너뜀)으로
+FastAPI 앱에 요청을 보내고, 동시 세션 수를 늘려가며 결과를 출력한다.
+
+- 기본: 같은 프로세스 안에서 httpx ASGITransport로 앱 호출 (네트워크 불필요)
+  ▷ iot_client는 FakeIoTClient로 바꿔서 AWS 호출 없이 발행 횟수만 센다
+  ▷ 앱 핸들러가 이벤트 루프를 막는 시간까지 지연에 포함됨 (uvicorn 워커 1개와 같은 조건)
+- --url: 이미 떠 있는 서버에 HTTP로 요청 (이 경우 IoT는 서버 설정을 그대로 사용)
+
+측정 항목: 처리량(req/s), p50/p95/p99 지연(ms), 오류율, 건너뛴(dropped) 프레임 비율, IoT 발행 수,
+          프로세스 내부 호출이면 세션들이 센 반복 수 합계
+--adaptive: 고정 간격 대신 응답의 next_interval_ms를 따라 전송 (보낸 프레임 수/반복 수를 고정 간격과 비교)
+
+사용법 (backend 디렉터리에서, httpx 필요):
+    python -m tools.loadtest --levels 1,2,4,8 --duration 10
+    python -m tools.loadtest --mode landmarks --levels 1,8,32,64
+    python -m tools.loadtest --levels 1,8 --adaptive
+    python -m tools.loadtest --url http://127.0.0.1:8000 --levels 1,4,16
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+from collections import Counter
+
+import cv2
+import httpx
+import numpy as np
+
+from app import main
+
+DEFAULT_VIDEO = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "public", "001.mp4")
+
+
+class FakeIoTClient:
+    """boto3 'iot-data' 클라이언트 대신 쓰는 로컬 가짜 - 발행된 메시지 수만 센다"""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency   # 실제 publish 호출처럼 블로킹 지연 흉내 (초)
+        self.published = 0
+        self.topics = Counter()
+
+    def publish(self, topic, qos=1, payload=""):
+        if self.latency:
+            time.sleep(self.latency)
+        self.published += 1
+        self.topics[topic] += 1
+        return {}
+
+
+class LevelStats:
+    """동시 세션 수 한 단계의 측정 결과"""
+    def __init__(self):
+        self.latencies = []
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.ticks = 0
+
+    def summary(self, level: int, elapsed: float, iot_published: int, reps: int):
+        lat = np.array(self.latencies) * 1000.0 if self.latencies else np.zeros(1)
+        return {
+            "sessions": level,
+            "sent": self.sent,
+            "completed": len(self.latencies),
+            "throughput_rps": round(len(self.latencies) / elapsed, 1),
+            "p50_ms": round(float(np.percentile(lat, 50)), 1),
+            "p95_ms": round(float(np.percentile(lat, 95)), 1),
+            "p99_ms": round(float(np.percentile(lat, 99)), 1),
+            "error_rate": round(self.errors / max(1, self.sent), 4),
+            "dropped_rate": round(self.dropped / max(1, self.ticks), 4),
+            "iot_published": iot_published,
+            "reps": reps,
+        }
+
+
+def load_video_frames(path: str, max_frames: int, width: int, quality: int):
+    """영상에서 프레임을 읽어 프론트엔드와 같은 data URL(JPEG base64)로 변환"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ok, img = cap.read()
+        if not ok:
+            break
+        if width and img.shape[1] != width:
+            height = int(img.shape[0] * width / img.shape[1])
+            img = cv2.resize(img, (width, height))
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            frames.append("data:image/jpeg;base64," + base64.b64encode(buf.tobytes()).decode())
+    cap.release()
+    if not frames:
+        raise SystemExit(f"❌ 영상에서 프레임을 읽지 못했습니다: {path}")
+    return frames
+
+
+def extract_landmark_frames(image_frames):
+    """landmarks 모드용 - 각 프레임을 미리 포즈 추론해서 [x, y, z, visibility] 배열로 변환"""
+    detector = main.mp_pose.Pose(static_image_mode=False, model_complexity=1)
+    frames = []
+    for data_url in image_frames:
+        buf = np.frombuffer(base64.b64decode(data_url.split(",")[1]), np.uint8)
+        img = cv2.cvtColor(cv2.imdecode(buf, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        results = detector.process(img)
+        if results.pose_landmarks:
+            frames.append([[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark])
+    detector.close()
+    if not frames:
+        raise SystemExit("❌ 영상에서 포즈를 하나도 찾지 못했습니다")
+    return frames
+
+
+def build_payload(mode: str, frame, exercise_code: str, session_id: str):
+    if mode == "landmarks":
+        return "/api/analyze-landmarks", {
+            "frames": [frame],
+            "exercise_code": exercise_code,
+            "session_id": session_id,
+        }
+    return "/api/analyze-pose", {
+        "image": frame,
+        "exercise_code": exercise_code,
+        "session_id": session_id,
+    }
+
+
+async def send_frame(client, path, payload, stats: LevelStats):
+    """요청 하나 전송 - 성공하면 응답 본문 반환"""
+    stats.sent += 1
+    t0 = time.perf_counter()
+    try:
+        resp = await client.post(path, json=payload)
+        latency = time.perf_counter() - t0
+        if resp.status_code != 200:
+            stats.errors += 1
+            return
+        body = resp.json()
+        # 포즈 미검출은 정상 응답으로 본다
+        if not body.get("success") and body.get("message") != "No pose detected":
+            stats.errors += 1
+            return
+        stats.latencies.append(latency)
+        return body
+    except Exception:
+        stats.errors += 1
+
+
+async def run_session(client, idx, frames, args, level, deadline, stats: LevelStats):
+    """
+    세션 하나 - fps 간격으로 프레임 전송, 이전 요청이 진행 중이면 그 프레임은 건너뜀
+    - adaptive: 마지막 응답의 next_interval_ms로 다음 전송 간격을 바꿈
+    - 영상 재생 위치는 전송 여부와 상관없이 실제 경과 시간(fps)을 따름
+    """
+    interval = 1.0 / args.fps
+    session_id = f"loadtest-{level}-{idx}"
+    offset = random.randrange(len(frames))   # 세션마다 다른 위치에서 재생
+    start = time.perf_counter()
+    next_tick = start + random.uniform(0, interval)
+    in_flight = None
+
+    while True:
+        now = time.perf_counter()
+        if next_tick >= deadline:
+            break
+        if next_tick > now:
+            await asyncio.sleep(next_tick - now)
+        tick = next_tick
+        stats.ticks += 1
+
+        if in_flight is not None and not in_flight.done():
+            next_tick += interval
+            stats.dropped += 1
+            continue
+
+        if args.adaptive and in_flight is not None:
+            body = in_flight.result()
+            if body and body.get("next_interval_ms"):
+                interval = body["next_interval_ms"] / 1000.0
+        next_tick += interval
+
+        frame = frames[(offset + int((tick - start) * args.fps)) % len(frames)]
+        path, payload = build_payload(args.mode, frame, args.exercise_code, session_id)
+        in_flight = asyncio.create_task(send_frame(client, path, payload, stats))
+
+    if in_flight is not None:
+        await in_flight
+
+
+async def run_level(client, level, frames, args, fake_iot):
+    main.SESSIONS.clear()
+    published_before = fake_iot.published if fake_iot else 0
+    stats = LevelStats()
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[
+        run_session(client, idx, frames, args, level, deadline, stats)
+        for idx in range(level)
+    ])
+    elapsed = time.perf_counter() - start
+
+    published = (fake_iot.published - published_before) if fake_iot else 0
+    reps = sum(det.total_reps for s in main.SESSIONS.values()
+               for det in s.detectors.values() if isinstance(det, main.RepCounter))
+    return stats.summary(level, elapsed, published, reps)
+
+
+def print_table(rows):
+    header = f"{'sessions':>8} {'sent':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6} {'drop%':>6} {'iot':>6} {'reps':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['sessions']:>8} {r['sent']:>7} {r['throughput_rps']:>8} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+            f"{r['error_rate'] * 100:>6.1f} {r['dropped_rate'] * 100:>6.1f} {r['iot_published']:>6} {r['reps']:>6}"
+        )
+
+
+async def main_async(args):
+    print(f"🎬 프레임 로딩: {args.video}")
+    frames = load_video_frames(args.video, args.max_frames, args.width, args.quality)
+    if args.mode == "landmarks":
+        frames = extract_landmark_frames(frames)
+    print(f"✅ {len(frames)}개 프레임 준비 완료 (mode={args.mode})")
+
+    fake_iot = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        fake_iot = FakeIoTClient(latency=args.iot_latency_ms / 1000.0)
+        main.iot_client = fake_iot
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+
+    rows = []
+    async with client:
+        for level in args.levels:
+            print(f"🚀 동시 세션 {level}개 - {args.duration}초 진행 중...")
+            rows.append(await run_level(client, level, frames, args, fake_iot))
+
+    print()
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 저장: {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="FitAI 백엔드 동시 세션 부하 테스트")
+    parser.add_argument("--video", default=DEFAULT_VIDEO, help="프레임을 뽑을 녹화 영상")
+    parser.add_argument("--mode", choices=["image", "landmarks"], default="image",
+                        help="image: /api/analyze-pose, landmarks: /api/analyze-landmarks")
+    parser.add_argument("--levels", default="1,2,4,8,16",
+                        type=lambda s: [int(x) for x in s.split(",")], help="동시 세션 수 목록")
+    parser.add_argument("--duration", type=float, default=10.0, help="단계별 측정 시간(초)")
+    parser.add_argument("--fps", type=float, default=5.0, help="세션당 전송 빈도 (프론트엔드 기본 200ms 간격)")
+    parser.add_argument("--adaptive", action="store_true", help="응답의 next_interval_ms를 따라 전송 간격 조절")
+    parser.add_argument("--exercise-code", default="001")
+    parser.add_argument("--max-frames", type=int, default=150)
+    parser.add_argument("--width", type=int, default=640, help="프레임 가로 크기 (0이면 원본)")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG 품질 (프론트엔드 기본 0.8)")
+    parser.add_argument("--iot-latency-ms", type=float, default=0.0, help="가짜 IoT publish 지연")
+    parser.add_argument("--url", default=None, help="실행 중인 서버 주소 (없으면 프로세스 내부 호출)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과를 저장할 JSON 파일")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    asyncio.run(main_async(args))
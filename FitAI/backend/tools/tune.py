@@ -0,0 +1,466 @@
+"""
+RepCounter/HoldTimer 임계값과 EXERCISE_PARAMS 오프라인 자동 튜닝
+
+라벨이 달린 녹화 랜드마크 시퀀스를 받아 파라미터 격자(grid)를 CPU 코어 수만큼 병렬로 재생하고,
+운동별 최적 파라미터와 정확도/실행 시간 리포트를 출력한다.
+
+- 시퀀스마다 프레임별 특징(검출기 관절 각도, 팔꿈치/무릎 각도, yaw, 현재 파라미터의 분석 결과)을
+  한 번만 계산해서 캐시 (--cache-dir를 주면 디스크에도 저장)
+- 반복/유지 검출기는 서버와 같은 update 코드(replay_detector)로 재생
+  (필수 부위 가시성 체크도 analyze_landmarks와 같게 적용)
+- errorCodes 판정은 캐시된 특징으로 NumPy 벡터 연산 (score_pose_components의 오류 판정과 동일한 식,
+  시작 시 현재 파라미터로 결과가 일치하는지 검증)
+
+시퀀스 파일 형식 (JSON, frames는 /api/analyze-landmarks와 같은 [x, y, z, visibility] 배열):
+    {
+        "exercise_code": "001",
+        "fps": 5,                      # 또는 "timestamps": [초, ...]
+        "frames": [[[x, y, z, v], ... 33개], ...],
+        "reps": 10,                    # 반복 운동: 실제 반복 수
+        "correct_reps": 8,             # (선택) 올바른 반복 수
+        "hold_sec": 30.0,              # 유지 운동(플랭크): 실제 유지 시간
+        "frame_errors": [[], [3], ...] # (선택) 프레임별 실제 errorCodes - EXERCISE_PARAMS 튜닝에 사용
+    }
+
+사용법 (backend 디렉터리에서):
+    python -m tools.tune recordings/*.json --workers 8 --output tune_report.json
+    python -m tools.tune recordings/*.json --grid my_grid.json --cache-dir .tune_cache
+"""
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app import main
+
+# 반복 검출기 격자 (RepCounter 생성자 인자)
+DEFAULT_REP_GRID = {
+    "top_thr": [140.0, 145.0, 150.0, 155.0, 160.0],
+    "bottom_thr": [95.0, 100.0, 105.0, 110.0, 115.0, 120.0],
+    "min_motion_deg": [5.0, 10.0, 15.0, 20.0],
+    "min_down_frames": [1, 2, 3, 4],
+    "min_depth_bonus": [0.0, 5.0, 10.0],
+    "smooth_window": [1, 3],
+}
+
+# 유지 타이머 격자 (HoldTimer 생성자 인자)
+DEFAULT_HOLD_GRID = {
+    "low": [150.0, 155.0, 160.0, 165.0, 170.0],
+    "min_hold_sec": [0.5, 1.0, 2.0],
+    "grace_sec": [0.25, 0.5, 1.0],
+}
+
+# EXERCISE_PARAMS 격자 - 현재 값 기준 상대 범위
+def default_score_grid(current: dict):
+    return {
+        "target_elbow_deg": [current["target_elbow_deg"] + d for d in (-20, -10, 0, 10, 20)],
+        "width_elbow_sigm": [20, 25, 30, 35, 40],
+        "min_elbow_score": [0, 3, 5, 7, 9],
+        "target_knee_deg": [current["target_knee_deg"] + d for d in (-15, -10, -5, 0, 5, 10, 15)],
+        "allow_knee_deviation": [15, 20, 25, 30, 35],
+    }
+
+
+# ================== 시퀀스 로딩 / 특징 캐시 ==================
+FEATURE_CACHE_VERSION = 3   # extract_features가 바뀌면 올려서 이전 캐시 무시
+
+
+def load_sequence(path: str):
+    with open(path, encoding="utf-8") as f:
+        seq = json.load(f)
+    seq["path"] = path
+    code = seq.get("exercise_code", seq.get("exercise", "standing"))
+    seq["score_key"] = main.EXERCISE_CODE_MAPPING.get(code, code.lower())
+    seq["detector_key"] = main.EXERCISE_DETECTOR_MAPPING.get(code, seq["score_key"])
+    return seq
+
+
+def extract_features(seq: dict):
+    """
+    시퀀스 하나의 프레임별 특징 - 파라미터와 무관한 값만 계산
+    - analyze_landmarks처럼 필수 부위(REQUIRED_LANDMARKS)가 안 보이는 프레임은 keep=False
+      ▷ 검출기 각도 NaN, 분석 결과 None, 오류 없음
+    """
+    frames = np.asarray(seq["frames"], dtype=np.float64)
+    n = len(frames)
+    if frames.shape[2] < 4:
+        frames = np.concatenate([frames, np.ones((n, frames.shape[1], 1))], axis=2)
+
+    if "timestamps" in seq:
+        timestamps = np.asarray(seq["timestamps"], dtype=np.float64)
+    else:
+        timestamps = np.arange(n) / float(seq.get("fps", 5.0))
+
+    keep = np.all(frames[:, main.REQUIRED_LANDMARKS, 3] >= main.REQUIRED_MIN_VISIBILITY, axis=1)
+
+    angles = main.compute_joint_angles_batch(
+        frames, ["left_elbow", "right_elbow", "left_knee", "right_knee"])
+
+    # score_pose_components의 yaw 추정과 같은 식 (어깨 x/z 차이)
+    dx = frames[:, 12, 0] - frames[:, 11, 0]
+    dz = frames[:, 12, 2] - frames[:, 11, 2]
+    yaw = np.abs(np.degrees(np.arctan2(np.abs(dz), np.abs(dx) + 1e-6)))
+
+    # 현재 파라미터 기준 분석 결과 (반복의 정확/오류 판정에 사용)
+    analyses = []
+    for i, frame in enumerate(frames):
+        if not keep[i]:
+            analyses.append(None)
+            continue
+        lms = [{"x": p[0], "y": p[1], "z": p[2], "visibility": p[3]} for p in frame]
+        a = main.score_pose_components(lms, seq["score_key"])
+        analyses.append({"errorCodes": a["errorCodes"], "score": a["score"]})
+
+    features = {
+        "timestamps": timestamps,
+        "keep": keep,
+        "yaw": yaw,
+        "left_elbow": angles["left_elbow"],
+        "right_elbow": angles["right_elbow"],
+        "left_knee": angles["left_knee"],
+        "right_knee": angles["right_knee"],
+        "analyses": analyses,
+    }
+    if seq["detector_key"] in main.EXERCISE_DETECTOR_PARAMS:
+        detector_angle = main.detector_angles_batch(seq["detector_key"], frames)
+        features["detector_angle"] = np.where(keep, detector_angle, np.nan)
+    return features
+
+
+def load_features(seq: dict, cache_dir: str = None):
+    """
+    특징 캐시 - 파일 내용과 현재 EXERCISE_PARAMS/EXERCISE_DETECTOR_PARAMS가 같으면 디스크에서 재사용
+    - analyses(현재 파라미터의 분석 결과)가 파라미터에 따라 바뀌므로 튜닝 결과를 반영하면 캐시도 새로 만듦
+    """
+    if not cache_dir:
+        return extract_features(seq)
+
+    h = hashlib.sha1()
+    with open(seq["path"], "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps([main.EXERCISE_PARAMS, main.EXERCISE_DETECTOR_PARAMS], sort_keys=True, default=str).encode())
+    digest = h.hexdigest()
+    cache_path = os.path.join(cache_dir, f"{digest}.v{FEATURE_CACHE_VERSION}.npz")
+    if os.path.exists(cache_path):
+        data = np.load(cache_path, allow_pickle=False)
+        features = {k: data[k] for k in data.files if k != "analyses_json"}
+        features["analyses"] = json.loads(str(data["analyses_json"]))
+        return features
+
+    features = extract_features(seq)
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {k: v for k, v in features.items() if k != "analyses"}
+    np.savez(cache_path, analyses_json=json.dumps(features["analyses"]), **arrays)
+    return features
+
+
+# ================== 평가 ==================
+def predict_error_codes(features: dict, params: dict):
+    """
+    캐시된 특징으로 프레임별 오류 판정 (T, 4) - score_pose_components와 같은 식
+    - 필수 부위가 안 보여 분석하지 않은 프레임(keep=False)은 서버처럼 오류 없음
+    - 팔: min_elbow_score > 0이고 팔꿈치 시그모이드 점수가 그보다 낮으면 오류 (각도 없음 = 0점)
+    - 다리: 무릎 각도가 target_knee_deg에서 allow_knee_deviation보다 벗어나면 오류 (각도 없음 = 정상)
+    """
+    width = np.maximum(params["width_elbow_sigm"] * (1.0 + 0.008 * features["yaw"]), 1e-6)
+
+    def elbow_score(angle):
+        with np.errstate(over="ignore", invalid="ignore"):
+            s = 15.0 / (1.0 + np.exp(np.abs(angle - params["target_elbow_deg"]) / width))
+        return np.where(np.isnan(angle), 0.0, s)
+
+    def knee_bad(angle):
+        with np.errstate(invalid="ignore"):
+            return ~np.isnan(angle) & (np.abs(angle - params["target_knee_deg"]) > params["allow_knee_deviation"])
+
+    min_score = params["min_elbow_score"]
+    n = len(features["yaw"])
+    if min_score > 0:
+        left_arm = elbow_score(features["left_elbow"]) < min_score
+        right_arm = elbow_score(features["right_elbow"]) < min_score
+    else:
+        left_arm = right_arm = np.zeros(n, dtype=bool)
+    pred = np.stack([left_arm, right_arm, knee_bad(features["left_knee"]), knee_bad(features["right_knee"])], axis=1)
+    return pred & features["keep"][:, None]
+
+
+def _codes_to_mask(frame_errors):
+    mask = np.zeros((len(frame_errors), 4), dtype=bool)
+    for i, codes in enumerate(frame_errors):
+        for code in codes:
+            if 1 <= code <= 4:
+                mask[i, code - 1] = True
+    return mask
+
+
+def evaluate_score_params(params: dict, items: list):
+    """EXERCISE_PARAMS 한 조합 평가 - 프레임 정확도와 부위별 F1 평균"""
+    exact = 0
+    total = 0
+    tp = np.zeros(4)
+    fp = np.zeros(4)
+    fn = np.zeros(4)
+    for features, truth in items:
+        pred = predict_error_codes(features, params)
+        exact += int(np.all(pred == truth, axis=1).sum())
+        total += len(truth)
+        tp += (pred & truth).sum(axis=0)
+        fp += (pred & ~truth).sum(axis=0)
+        fn += (~pred & truth).sum(axis=0)
+    denom = 2 * tp + fp + fn
+    f1 = np.where(denom > 0, 2 * tp / np.maximum(denom, 1), 1.0)
+    return {
+        "frame_accuracy": round(exact / max(1, total), 4),
+        "macro_f1": round(float(f1.mean()), 4),
+    }
+
+
+def evaluate_detector_params(detector_key: str, params: dict, items: list):
+    """반복/유지 검출기 한 조합 평가 - 서버와 같은 update 코드로 재생"""
+    abs_errors = []
+    correct_errors = []
+    exact = 0
+    for features, label in items:
+        detector = main.create_detector(detector_key)
+        for key, value in params.items():
+            setattr(detector, key, value)
+        result = main.replay_detector(detector, features["detector_angle"],
+                                      features["timestamps"], features["analyses"])
+
+        if result["type"] == "hold":
+            err = abs(result["total_sec"] - label["hold_sec"])
+            exact += int(err <= 1.0)
+        else:
+            err = abs(result["total"] - label["reps"])
+            exact += int(err == 0)
+            if label.get("correct_reps") is not None:
+                correct_errors.append(abs(result["correct"] - label["correct_reps"]))
+        abs_errors.append(err)
+
+    mae = float(np.mean(abs_errors))
+    correct_mae = float(np.mean(correct_errors)) if correct_errors else None
+    return {
+        "mae": round(mae, 4),
+        "correct_mae": None if correct_mae is None else round(correct_mae, 4),
+        "exact_rate": round(exact / max(1, len(items)), 4),
+        # 정렬 기준: 전체 수 오차 우선, 정확 반복 수 오차는 절반 가중
+        "objective": round(mae + 0.5 * (correct_mae or 0.0), 4),
+    }
+
+
+# ================== 병렬 실행 ==================
+_WORKER_ITEMS = None
+
+def _init_worker(items):
+    global _WORKER_ITEMS
+    _WORKER_ITEMS = items
+
+
+def _eval_chunk(task):
+    kind, key, combos = task
+    results = []
+    for params in combos:
+        if kind == "score":
+            metrics = evaluate_score_params(params, _WORKER_ITEMS[("score", key)])
+        else:
+            metrics = evaluate_detector_params(key, params, _WORKER_ITEMS[("detector", key)])
+        results.append((params, metrics))
+    return kind, key, results
+
+
+def expand_grid(grid: dict, base: dict = None):
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        params = dict(base or {})
+        params.update(zip(keys, values))
+        yield params
+
+
+def _valid_detector_params(params: dict):
+    if "top_thr" in params and params["top_thr"] <= params["bottom_thr"]:
+        return False
+    return True
+
+
+def run_tuning(seqs, features, args, grids):
+    items = {}
+    tasks = []
+
+    # 반복/유지 검출기
+    by_detector = {}
+    for seq, feat in zip(seqs, features):
+        key = seq["detector_key"]
+        cfg = main.EXERCISE_DETECTOR_PARAMS.get(key)
+        if cfg is None:
+            continue
+        label_key = "hold_sec" if cfg["type"] == "hold" else "reps"
+        if seq.get(label_key) is None:
+            continue
+        by_detector.setdefault(key, []).append(
+            (feat, {"reps": seq.get("reps"), "correct_reps": seq.get("correct_reps"), "hold_sec": seq.get("hold_sec")}))
+
+    for key, group in by_detector.items():
+        items[("detector", key)] = group
+        cfg = main.EXERCISE_DETECTOR_PARAMS[key]
+        grid = grids["hold"] if cfg["type"] == "hold" else grids["rep"]
+        combos = [p for p in expand_grid(grid) if _valid_detector_params(p)]
+        tasks.extend(("detector", key, combos[i:i + args.chunk]) for i in range(0, len(combos), args.chunk))
+
+    # EXERCISE_PARAMS
+    by_score = {}
+    for seq, feat in zip(seqs, features):
+        if seq.get("frame_errors") is None:
+            continue
+        by_score.setdefault(seq["score_key"], []).append((feat, _codes_to_mask(seq["frame_errors"])))
+
+    for key, group in by_score.items():
+        items[("score", key)] = group
+        current = main.EXERCISE_PARAMS.get(key, main.EXERCISE_PARAMS["standing"])
+        grid = grids.get("score", {}).get(key) or default_score_grid(current)
+        combos = list(expand_grid(grid))
+        tasks.extend(("score", key, combos[i:i + args.chunk]) for i in range(0, len(combos), args.chunk))
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(items,)) as pool:
+        for kind, key, chunk in pool.map(_eval_chunk, tasks):
+            results.setdefault((kind, key), []).extend(chunk)
+    return items, results
+
+
+def verify_error_formula(seqs, features):
+    """벡터화한 오류 판정이 현재 파라미터에서 score_pose_components와 일치하는지 확인"""
+    agree = 0
+    total = 0
+    for seq, feat in zip(seqs, features):
+        params = main.EXERCISE_PARAMS.get(seq["score_key"], main.EXERCISE_PARAMS["standing"])
+        pred = predict_error_codes(feat, params)
+        truth = _codes_to_mask([a["errorCodes"] if a else [] for a in feat["analyses"]])
+        agree += int(np.all(pred == truth, axis=1).sum())
+        total += len(truth)
+    return agree / max(1, total)
+
+
+def _distance_from_current(params: dict, current: dict, spans: dict):
+    """격자 폭으로 정규화한 현재 값과의 거리 - 점수가 같은 조합 중 현재 값에 가까운 것을 고르는 데 사용"""
+    return sum(abs(v - current[k]) / spans[k] for k, v in params.items() if current.get(k) is not None)
+
+
+def summarize(items, results, top: int):
+    """
+    조합별 결과 정렬 + 현재 파라미터와 비교
+    - 점수가 같으면 현재 값에 가까운 조합 우선 (격자 순서로 임의의 조합이 "최적"이 되지 않게)
+    - 현재 파라미터가 최고 점수와 같으면 change=False, best_params는 현재 값
+    """
+    report = {}
+    for (kind, key), rows in sorted(results.items()):
+        if kind == "score":
+            rank = lambda m: (-m["macro_f1"], -m["frame_accuracy"])
+            current = dict(main.EXERCISE_PARAMS.get(key, main.EXERCISE_PARAMS["standing"]))
+            baseline = evaluate_score_params(current, items[(kind, key)])
+            section = "exercise_params"
+        else:
+            rank = lambda m: (m["objective"], -m["exact_rate"])
+            detector = main.create_detector(key)
+            current = {k: getattr(detector, k, None) for k in rows[0][0]}
+            baseline = evaluate_detector_params(key, {}, items[(kind, key)])
+            section = "detectors"
+
+        spans = {}
+        for k in rows[0][0]:
+            values = [p[k] for p, _ in rows]
+            spans[k] = (max(values) - min(values)) or 1.0
+        rows.sort(key=lambda r: (rank(r[1]), _distance_from_current(r[0], current, spans)))
+
+        change = rank(rows[0][1]) < rank(baseline)
+        best_params = rows[0][0] if change else {k: current[k] for k in rows[0][0] if current.get(k) is not None}
+        report.setdefault(section, {})[key] = {
+            "sequences": len(items[(kind, key)]),
+            "combinations": len(rows),
+            "baseline": baseline,
+            "change": change,
+            "best_params": best_params,
+            "best_metrics": rows[0][1] if change else baseline,
+            "top": [{"params": p, "metrics": m} for p, m in rows[:top]],
+        }
+    return report
+
+
+def print_report(report):
+    for section, entries in report.items():
+        print(f"\n=== {section} ===")
+        for key, entry in entries.items():
+            print(f"[{key}] 시퀀스 {entry['sequences']}개, 조합 {entry['combinations']}개")
+            print(f"  현재:  {entry['baseline']}")
+            if not entry["change"]:
+                print("  변경 없음 - 현재 파라미터가 격자 최고 점수와 같습니다")
+                continue
+            print(f"  최적:  {entry['best_metrics']}")
+            print(f"  파라미터: {entry['best_params']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="RepCounter / EXERCISE_PARAMS 오프라인 자동 튜닝")
+    parser.add_argument("paths", nargs="+", help="라벨링된 시퀀스 JSON 파일 (glob 가능)")
+    parser.add_argument("--grid", default=None,
+                        help='격자 JSON {"rep": {...}, "hold": {...}, "score": {"squat": {...}}}')
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=64, help="워커에 한 번에 보내는 조합 수")
+    parser.add_argument("--cache-dir", default=None, help="프레임 특징 디스크 캐시 위치")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output", default=None, help="리포트를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in args.paths for p in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit("❌ 시퀀스 파일이 없습니다")
+
+    grids = {"rep": DEFAULT_REP_GRID, "hold": DEFAULT_HOLD_GRID, "score": {}}
+    if args.grid:
+        with open(args.grid, encoding="utf-8") as f:
+            grids.update(json.load(f))
+
+    t0 = time.perf_counter()
+    seqs = [load_sequence(p) for p in paths]
+    features = [load_features(s, args.cache_dir) for s in seqs]
+    t_features = time.perf_counter() - t0
+    n_frames = sum(len(f["yaw"]) for f in features)
+    print(f"📂 시퀀스 {len(seqs)}개 / {n_frames}프레임 특징 준비 {t_features:.2f}초")
+
+    agreement = verify_error_formula(seqs, features)
+    if agreement < 1.0:
+        print(f"⚠️ 벡터화 오류 판정이 score_pose_components와 {agreement * 100:.2f}%만 일치합니다")
+
+    t1 = time.perf_counter()
+    items, results = run_tuning(seqs, features, args, grids)
+    t_search = time.perf_counter() - t1
+    n_combos = sum(len(r) for r in results.values())
+
+    report = summarize(items, results, args.top)
+    report["runtime"] = {
+        "workers": args.workers,
+        "sequences": len(seqs),
+        "frames": n_frames,
+        "feature_sec": round(t_features, 3),
+        "search_sec": round(t_search, 3),
+        "combinations": n_combos,
+        "combinations_per_sec": round(n_combos / t_search, 1) if t_search > 0 else None,
+        "error_formula_agreement": round(agreement, 4),
+    }
+
+    print_report({k: v for k, v in report.items() if k != "runtime"})
+    print(f"\n⏱️ 탐색 {t_search:.2f}초, 조합 {n_combos}개 ({report['runtime']['combinations_per_sec']}개/초, 워커 {args.workers}개)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=float)
+        print(f"💾 리포트 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -39,6 +39,7 @@ interface PoseResult {
   success: boolean;
   landmarks?: Landmark[];
   analysis?: PoseAnalysis;
+  next_interval_ms?: number;
 }
 
 interface ExerciseScore {
@@ -51,6 +52,15 @@ interface ExerciseScore {
   elbowsScores: number[];
 }
 
+// 운동(페이지 진입)마다 새 세션 id - 백엔드가 반복 수/알림 타이머 등을 사용자별로 관리
+function createSessionId() {
+  if (typeof crypto !== "undefined" && "randomUUID" in crypto) {
+    return crypto.randomUUID();
+  }
+  // randomUUID는 보안 컨텍스트(https/localhost)에서만 제공됨
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 function ExerciseDetail() {
   const location = useLocation();
   const navigate = useNavigate();
@@ -59,6 +69,7 @@ function ExerciseDetail() {
 
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
+  const [sessionId] = useState(createSessionId);
   const [isCameraOn, setIsCameraOn] = useState(false);
   const [cameraError, setCameraError] = useState<string>("");
 
@@ -69,6 +80,8 @@ function ExerciseDetail() {
   const [poseAnalysis, setPoseAnalysis] = useState<PoseAnalysis | null>(null);
   const [landmarks, setLandmarks] = useState<Landmark[] | null>(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
+  // 서버가 권장하는 다음 프레임 전송 간격 (ms)
+  const [frameInterval, setFrameInterval] = useState(200);
 
   // 📊 점수 기록
   const [exerciseScores, setExerciseScores] = useState<ExerciseScore[]>([]);
@@ -258,11 +271,16 @@ function ExerciseDetail() {
         body: JSON.stringify({
           image: imageData,
           exercise_code: currentExercise.exercise_code.toLowerCase(),
+          session_id: sessionId,
         }),
       });
 
       const result: PoseResult = await response.json();
 
+      if (result.next_interval_ms) {
+        setFrameInterval(result.next_interval_ms);
+      }
+
       if (result.success && result.landmarks && result.analysis) {
         setLandmarks(result.landmarks);
         setPoseAnalysis(result.analysis);
@@ -329,10 +347,10 @@ function ExerciseDetail() {
 
     const interval = setInterval(() => {
       analyzePoseFrame();
-    }, 200);
+    }, frameInterval);
 
     return () => clearInterval(interval);
-  }, [isCameraOn, isAnalyzing]);
+  }, [isCameraOn, isAnalyzing, frameInterval]);
 
   const startCamera = async () => {
     try {